@@ -10,7 +10,22 @@ import pytz
 import pandas as pd
 import time
 import calendar
+import re
+import threading
+import queue
+import functools
+import abc
+import sqlite3
+import shutil
+import copy
+import io
+import zipfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.parquet as pq
 from fpdf import FPDF
+from fontTools.ttLib import TTFont
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -26,7 +41,57 @@ FIRESTORE_COLLECTION = "attendance_records"
 FIRESTORE_INVOICES = "invoices"
 FIRESTORE_CANCELLED = "cancelled_sessions"
 FIRESTORE_MEMBERS = "members"
+FIRESTORE_SESSION_SUMMARIES = "session_summaries"
+FIRESTORE_LEADERBOARD = "attendance_leaderboard"
+FIRESTORE_META = "app_meta"
+FIRESTORE_MIGRATIONS_DOC = "migrations"
 MEMBERS_SHEET_NAME = "Tagok"
+MEMBER_SHEET_HEADER = ["Név", "Email", "Aktív"]
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 465
+EMAIL_MAX_WORKERS = 3
+FANOUT_MAX_WORKERS = 4
+EMAIL_RATE_PER_SECOND = 2.0
+EMAIL_MAX_ATTEMPTS = 4
+EMAIL_BACKOFF_SECONDS = 1.0
+PDF_FONT_FILES = {"": "Roboto-Regular.ttf", "B": "Roboto-Bold.ttf"}
+PDF_TABLE_COLUMNS = [("Név", 90, "L"), ("Részvétel száma", 40, "C"), ("Fizetendő", 50, "R")]
+PDF_MONTH_COLUMNS = [("Hónap", 60, "L"), ("Alkalmak", 30, "C"), ("Részvételek", 40, "C"), ("Számla", 50, "R")]
+ATTENDANCE_FS_COLUMNS = ["ID", "Név", "Jön-e", "Regisztráció Időpontja", "Alkalom Dátuma", "Mód"]
+ATTENDANCE_FIELDS = ["name", "status", "timestamp", "event_date", "mode"]
+MEMBER_FIELDS = ["name", "email", "active"]
+ATTENDANCE_SORT_FIELDS = {"Regisztráció Időpontja": "timestamp", "Alkalom Dátuma": "event_date", "Név": "name",
+                          "Jön-e": "status", "Mód": "mode"}
+DB_PAGE_SIZES = [25, 50, 100, 250]
+ATTENDANCE_MODES = ["valós", "teszt", "ismeretlen"]
+INVOICE_FIELDS = ["inv_date", "target_year", "target_month", "amount", "filename", "month_name"]
+FIRESTORE_DATE_KEY_FORMAT = "%Y-%m-%d"
+FIRESTORE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+FIRESTORE_BATCH_LIMIT = 500
+ATTENDANCE_REFRESH_SECONDS = 60
+ATTENDANCE_FULL_RESYNC_SECONDS = 3600
+ATTENDANCE_WATERMARK_START = datetime(1970, 1, 1, tzinfo=pytz.utc)
+TIMESTAMP_RE = re.compile(r"^\s*(\d{4})\s*[.-]\s*(\d{1,2})\s*[.-]\s*(\d{1,2})\.?(?:[ T]+(\d{1,2}):(\d{2})(?::(\d{2}))?)?\s*$")
+PARSE_DATE_CACHE_SIZE = 4096
+SQLITE_DB_FILE = "ropi_local.sqlite3"
+ATTENDANCE_OUTBOX_FILE = "attendance_outbox.jsonl"
+PARQUET_EXPORT_DIR = "parquet_export"
+PARQUET_MANIFEST_FILE = "_manifest.json"
+PARQUET_BATCH_ROWS = 10000
+OUTBOX_RETRY_SECONDS = 2.0
+OUTBOX_MAX_BACKOFF_SECONDS = 300
+OUTBOX_RECENT_LIMIT = 5
+OUTBOX_BACKEND_LABELS = {"gs": "Google Sheet", "fs": "Firestore"}
+METRICS_HISTORY_LIMIT = 50
+METRIC_FIELDS = ["calls", "reads", "writes", "bytes", "seconds", "hits", "misses"]
+GSPREAD_API_PROPERTIES = {"sheet1"}
+GSPREAD_READ_METHODS = {"get_all_values", "get_all_records", "get_values", "get", "batch_get", "col_values", "row_values"}
+GSPREAD_WRITE_METHODS = {"append_rows", "append_row", "update", "batch_update", "clear", "delete_rows",
+                         "insert_rows", "update_cell", "update_cells"}
+FIRESTORE_CHAIN_METHODS = {"collection", "document", "where", "order_by", "limit", "limit_to_last", "offset",
+                           "select", "start_at", "start_after", "end_at", "end_before", "collection_group"}
+MONTH_NAMES_HU = ["Január", "Február", "Március", "Április", "Május", "Június",
+                  "Július", "Augusztus", "Szeptember", "Október", "November", "December"]
 
 MAIN_NAME_LIST = [
     "Anna Sengler", "Annamária Földváry", "Flóra", "Boti",
@@ -106,6 +171,57 @@ def get_firestore_db():
         st.error(f"Firestore indítási hiba: {e}")
     return None
 
+def _configured_spreadsheet_key():
+    try:
+        return st.secrets["gsheet"]["spreadsheet_id"]
+    except Exception:
+        return None
+
+@st.cache_resource
+def _sheet_handles():
+    return {"lock": threading.Lock(), "client": None, "key": None, "spreadsheet": None, "worksheets": None}
+
+def reset_sheet_handles():
+    handles = _sheet_handles()
+    with handles["lock"]:
+        handles.update(client=None, spreadsheet=None, worksheets=None)
+
+def _same_proxy(proxy, value):
+    return proxy._wrap(value) if isinstance(proxy, InstrumentedClient) else value
+
+def _find_worksheet(worksheets, title):
+    if title is None:
+        return worksheets[0] if worksheets else None
+    for ws in worksheets:
+        if ws.title == title:
+            return ws
+    return next((ws for ws in worksheets if ws.title.casefold() == title.casefold()), None)
+
+def sheet_worksheet(gs_client, title=None, create_header=None):
+    handles = _sheet_handles()
+    client = _unwrap(gs_client)
+    with handles["lock"]:
+        if handles["client"] is not client or handles["spreadsheet"] is None:
+            key = handles["key"] or _configured_spreadsheet_key()
+            try:
+                ss = _unwrap(gs_client.open_by_key(key) if key else gs_client.open(GSHEET_NAME))
+            except Exception:
+                handles["key"] = None
+                raise
+            handles.update(client=client, key=ss.id, spreadsheet=ss, worksheets=None)
+        ss = _same_proxy(gs_client, handles["spreadsheet"])
+        ws = _find_worksheet(handles["worksheets"] or [], title)
+        if ws is None:
+            handles["worksheets"] = [_unwrap(w) for w in ss.worksheets()]
+            ws = _find_worksheet(handles["worksheets"], title)
+        if ws is None and create_header is not None:
+            ws = _unwrap(ss.add_worksheet(title=title, rows=100, cols=max(5, len(create_header))))
+            _same_proxy(gs_client, ws).append_row(create_header)
+            handles["worksheets"].append(ws)
+    if ws is None:
+        raise gspread.exceptions.WorksheetNotFound(title)
+    return _same_proxy(gs_client, ws)
+
 def generate_tuesday_dates(past_count=8, future_count=2):
     tuesday_dates_list = []
     today = datetime.now(HUNGARY_TZ).date()
@@ -129,7 +245,11 @@ def get_tuesdays_in_month(year, month):
 def parse_date_str(date_str):
     if not date_str or pd.isna(date_str):
         return None
-    clean_str = str(date_str).strip()
+    return _parse_date_cached(str(date_str))
+
+@functools.lru_cache(maxsize=PARSE_DATE_CACHE_SIZE)
+def _parse_date_cached(raw):
+    clean_str = raw.strip()
     if clean_str.lower() in ['nan', 'none', '']:
         return None
     if clean_str.endswith('.'):
@@ -141,182 +261,992 @@ def parse_date_str(date_str):
         try:
             return datetime.strptime(clean_str, "%Y-%m-%d %H:%M:%S").date()
         except Exception:
-            return None
+            ts = _parse_timestamp_cached(raw)
+            return ts.date() if ts else None
+
+def parse_timestamp_str(value):
+    if not value or pd.isna(value):
+        return None
+    return _parse_timestamp_cached(str(value))
+
+@functools.lru_cache(maxsize=PARSE_DATE_CACHE_SIZE)
+def _parse_timestamp_cached(raw):
+    m = TIMESTAMP_RE.match(raw)
+    if not m:
+        return None
+    try:
+        return datetime(*(int(part or 0) for part in m.groups()))
+    except ValueError:
+        return None
+
+def normalize_event_date(value):
+    date_obj = parse_date_str(value)
+    return date_obj.strftime(FIRESTORE_DATE_KEY_FORMAT) if date_obj else (value or "")
+
+def normalize_timestamp(value):
+    ts = parse_timestamp_str(value)
+    return ts.strftime(FIRESTORE_TIMESTAMP_FORMAT) if ts else (value or "")
+
+def stamp_updated(data):
+    return dict(data, updated_at=firestore.SERVER_TIMESTAMP)
+
+def canonical_attendance_fields(data):
+    out = dict(data)
+    if "event_date" in out:
+        out["event_date"] = normalize_event_date(out["event_date"])
+    if "timestamp" in out:
+        out["timestamp"] = normalize_timestamp(out["timestamp"])
+    return out
+
+def parse_date_series(values):
+    raw = pd.Series(values, dtype=object)
+    codes, uniques = pd.factorize(raw.where(raw.notna(), "").astype(str))
+    text = pd.Series(uniques, dtype=object).str.strip()
+    text = text.mask(text.str.lower().isin(["nan", "none"]), "")
+    clean = text.str.replace(r"\.$", "", regex=True).str.replace(". ", "-", regex=False).str.replace(".", "-", regex=False)
+    parsed = pd.to_datetime(clean.str.replace(r" .*$", "", regex=True), format="%Y-%m-%d", errors="coerce")
+    dates = pd.Series(parsed.dt.date, dtype=object).where(parsed.notna(), None)
+    retry = parsed.isna() & (text != "")
+    if retry.any():
+        dates[retry] = [_parse_date_cached(v) for v in text[retry]]
+    return pd.Series(dates.to_numpy()[codes], index=raw.index, dtype=object)
 
 parse_hungarian_date = parse_date_str
 
-def save_all_data(gs_client, fs_client, rows):
-    success_gs = False
-    success_fs = False
-    error_msg_fs = ""
-    if gs_client:
+def _chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def commit_firestore_ops(db, ops):
+    batches = 0
+    for chunk in _chunked(ops, FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for kind, doc_ref, data in chunk:
+            if kind == "set":
+                batch.set(doc_ref, data)
+            elif kind == "merge":
+                batch.set(doc_ref, data, merge=True)
+            elif kind == "update":
+                batch.update(doc_ref, data)
+            elif kind == "delete":
+                batch.delete(doc_ref)
+        batch.commit()
+        batches += 1
+    return batches
+
+def editor_change_ops(db, collection_name, df, changes, to_update, to_new, new_ids=None):
+    col = db.collection(collection_name)
+    ops = [("delete", col.document(df.iloc[int(idx)]["ID"]), None) for idx in changes.get("deleted_rows", [])]
+    for idx, edits in changes.get("edited_rows", {}).items():
+        update = to_update(edits)
+        if update:
+            ops.append(("update", col.document(df.iloc[int(idx)]["ID"]), update))
+    added_rows = changes.get("added_rows", [])
+    for new_id, new_row in zip(new_ids or [None] * len(added_rows), added_rows):
+        data = to_new(new_row)
+        if data:
+            ops.append(("set", col.document(new_id), data))
+    return ops
+
+def apply_change_set_fs(db, ops):
+    results = []
+    for number, chunk in enumerate(_chunked(ops, FIRESTORE_BATCH_LIMIT), 1):
         try:
-            sheet = gs_client.open(GSHEET_NAME).sheet1
-            sheet.append_rows(rows, value_input_option='USER_ENTERED')
-            success_gs = True
+            commit_firestore_ops(db, chunk)
+            results.append({"batch": number, "ops": chunk, "ok": True, "error": ""})
         except Exception as e:
-            return False, f"Hiba a Google Sheet mentésekor: {e}"
-    if fs_client:
+            results.append({"batch": number, "ops": chunk, "ok": False, "error": str(e)})
+    return results
+
+def committed_changes(results):
+    deleted_ids, updated, added = [], {}, {}
+    for result in results:
+        if not result["ok"]:
+            continue
+        for kind, doc_ref, data in result["ops"]:
+            if kind == "delete":
+                deleted_ids.append(doc_ref.id)
+            elif kind == "update":
+                updated[doc_ref.id] = data
+            else:
+                added[doc_ref.id] = data
+    return deleted_ids, updated, added
+
+def insert_firestore_docs_atomic(db, collection_name, docs_by_id):
+    col = db.collection(collection_name)
+    committed = []
+    try:
+        for chunk in _chunked(list(docs_by_id.items()), FIRESTORE_BATCH_LIMIT):
+            commit_firestore_ops(db, [("set", col.document(doc_id), data) for doc_id, data in chunk])
+            committed.extend(doc_id for doc_id, _ in chunk)
+    except Exception:
+        commit_firestore_ops(db, [("delete", col.document(doc_id), None) for doc_id in committed])
+        raise
+    return len(committed)
+
+@st.cache_resource
+def _fanout_executor():
+    return ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix="fanout")
+
+def fan_out_writes(writes):
+    record = getattr(_metrics_local, "record", None)
+    futures = {backend: _fanout_executor().submit(_run_with_metrics, record, write) for backend, write in writes.items()}
+    results = {}
+    for backend, future in futures.items():
         try:
-            for r in rows:
-                doc_ref = fs_client.collection(FIRESTORE_COLLECTION).document()
-                doc_ref.set({
-                    "name": r[0], "status": r[1], "timestamp": r[2],
-                    "event_date": r[3], "mode": r[5] if len(r) > 5 else "ismeretlen"
-                })
-            success_fs = True
+            results[backend] = (True, future.result())
         except Exception as e:
-            error_msg_fs = str(e)
-    else:
-        error_msg_fs = "Nincs aktív Firestore kapcsolat."
-    st.cache_data.clear()
-    if success_gs and success_fs:
-        return True, "Sikeres mentés a Google Sheet-be és a Firestore-ba is! ✅☁️"
-    elif success_gs and not success_fs:
-        return True, f"Mentve a Sheet-be, de Firestore hiba: {error_msg_fs} ⚠️"
-    else:
+            results[backend] = (False, e)
+    return results
+
+def _attendance_fs_doc(r):
+    return stamp_updated(canonical_attendance_fields({"name": r[0], "status": r[1], "timestamp": r[2],
+                                        "event_date": r[3], "mode": r[5] if len(r) > 5 else "ismeretlen"}))
+
+def _deliver_attendance_gs(gs_client, entry):
+    sheet_worksheet(gs_client).append_rows(entry["rows"], value_input_option='USER_ENTERED')
+    invalidate_caches(GSHEET_NAME)
+
+def _deliver_attendance_fs(fs_client, entry):
+    added = {doc_id: _attendance_fs_doc(r) for doc_id, r in zip(entry["doc_ids"], entry["rows"])}
+    insert_firestore_docs_atomic(fs_client, FIRESTORE_COLLECTION, added)
+    apply_attendance_cache_changes(added=added)
+    invalidate_caches(FIRESTORE_COLLECTION)
+    update_session_summaries_fs(fs_client, [record_session_date(r[3], r[2]) for r in entry["rows"]])
+
+OUTBOX_DELIVERERS = {"gs": _deliver_attendance_gs, "fs": _deliver_attendance_fs}
+
+def _append_outbox_journal(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def _outbox_entry(rec, metrics=None):
+    return dict(rec, delivered=set(), attempts={}, errors={}, next_try=0.0, metrics=metrics)
+
+def _replay_outbox_journal(path):
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("type") == "enqueue":
+                entries[rec["id"]] = _outbox_entry(rec)
+            elif rec.get("type") == "delivered" and rec.get("id") in entries:
+                entries[rec["id"]]["delivered"].add(rec["backend"])
+    return {k: e for k, e in entries.items() if not e["delivered"] >= set(e["targets"])}
+
+def _compact_outbox_journal(outbox):
+    records = []
+    for e in outbox["entries"].values():
+        records.append({k: e[k] for k in ("type", "id", "rows", "doc_ids", "targets", "created")})
+        records += [{"type": "delivered", "id": e["id"], "backend": b} for b in sorted(e["delivered"])]
+    tmp_path = outbox["path"] + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, outbox["path"])
+
+def _flush_attendance_outbox(outbox):
+    with outbox["lock"]:
+        due = [e for e in outbox["entries"].values() if e["next_try"] <= time.time()]
+    for entry in due:
+        writes = {backend: functools.partial(OUTBOX_DELIVERERS[backend], outbox["clients"][backend], entry)
+                  for backend in entry["targets"]
+                  if backend not in entry["delivered"] and outbox["clients"].get(backend) is not None}
+        for backend, (ok, result) in _run_with_metrics(entry["metrics"], lambda: fan_out_writes(writes)).items():
+            with outbox["lock"]:
+                if not ok:
+                    attempts = entry["attempts"][backend] = entry["attempts"].get(backend, 0) + 1
+                    entry["errors"][backend] = str(result)
+                    entry["next_try"] = time.time() + min(OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1),
+                                                          OUTBOX_MAX_BACKOFF_SECONDS)
+                    continue
+                _append_outbox_journal(outbox["path"], [{"type": "delivered", "id": entry["id"], "backend": backend}])
+                entry["delivered"].add(backend)
+                entry["errors"].pop(backend, None)
+    with outbox["lock"]:
+        done = [k for k, e in outbox["entries"].items() if e["delivered"] >= set(e["targets"])]
+        for k in done:
+            outbox["recent"].append(outbox["entries"].pop(k))
+        del outbox["recent"][:-OUTBOX_RECENT_LIMIT]
+        if done:
+            _compact_outbox_journal(outbox)
+
+def _outbox_worker(outbox):
+    while True:
+        outbox["wake"].wait(OUTBOX_RETRY_SECONDS)
+        outbox["wake"].clear()
+        try:
+            _flush_attendance_outbox(outbox)
+        except Exception as e:
+            outbox["last_error"] = str(e)
+
+@st.cache_resource
+def _attendance_outbox(path=ATTENDANCE_OUTBOX_FILE):
+    outbox = {"lock": threading.Lock(), "wake": threading.Event(), "path": path,
+              "entries": _replay_outbox_journal(path), "recent": [], "clients": {}, "last_error": None}
+    threading.Thread(target=_outbox_worker, args=(outbox,), daemon=True, name="attendance-outbox").start()
+    return outbox
+
+def attendance_outbox(gs_client, fs_client):
+    outbox = _attendance_outbox()
+    outbox["clients"].update(gs=gs_client, fs=fs_client)
+    if outbox["entries"]:
+        outbox["wake"].set()
+    return outbox
+
+def save_all_data(gs_client, fs_client, rows):
+    targets = [b for b, client in (("gs", gs_client), ("fs", fs_client)) if client]
+    if not targets:
         return False, "Kritikus hiba, egyik adatbázis sem érhető el."
+    outbox = attendance_outbox(gs_client, fs_client)
+    col = fs_client.collection(FIRESTORE_COLLECTION) if fs_client else None
+    rec = {"type": "enqueue", "id": uuid.uuid4().hex, "rows": rows, "targets": targets,
+           "doc_ids": [col.document().id if col else uuid.uuid4().hex for _ in rows],
+           "created": datetime.now(HUNGARY_TZ).strftime("%Y-%m-%d %H:%M:%S")}
+    try:
+        with outbox["lock"]:
+            _append_outbox_journal(outbox["path"], [rec])
+            outbox["entries"][rec["id"]] = _outbox_entry(rec, session_background_metrics())
+    except OSError as e:
+        return False, f"Hiba a helyi mentési napló írásakor: {e}"
+    outbox["wake"].set()
+    return True, f"{len(rows)} sor rögzítve, a Sheet-be és a Firestore-ba mentés a háttérben fut. ⏳"
+
+def attendance_outbox_status(outbox):
+    def view(e):
+        return {"created": e["created"], "rows": len(e["rows"]), "targets": list(e["targets"]),
+                "delivered": set(e["delivered"]), "attempts": dict(e["attempts"]),
+                "errors": dict(e["errors"])}
+    with outbox["lock"]:
+        return {"pending": [view(e) for e in outbox["entries"].values()],
+                "recent": [view(e) for e in outbox["recent"]]}
+
+_metrics_local = threading.local()
+
+@st.cache_resource
+def _metrics_lock():
+    return threading.Lock()
+
+def _new_metrics_record(label):
+    return {"label": label, "page": None, "started": time.time(), "ended": None, "functions": {}}
+
+def session_background_metrics():
+    return st.session_state.setdefault("metrics_background", _new_metrics_record("háttér"))
+
+def record_metric(key, calls=0, reads=0, writes=0, nbytes=0, seconds=0.0, hit=None):
+    record = getattr(_metrics_local, "record", None)
+    if record is None:
+        return
+    with _metrics_lock():
+        m = record["functions"].setdefault(key, dict.fromkeys(METRIC_FIELDS, 0))
+        m["calls"] += calls
+        m["reads"] += reads
+        m["writes"] += writes
+        m["bytes"] += nbytes
+        m["seconds"] += seconds
+        if hit is not None:
+            m["hits" if hit else "misses"] += 1
+        record["ended"] = time.time()
+
+def _run_with_metrics(record, fn):
+    previous = getattr(_metrics_local, "record", None)
+    _metrics_local.record = record
+    try:
+        return fn()
+    finally:
+        _metrics_local.record = previous
+
+def begin_rerun_metrics():
+    history = st.session_state.setdefault("metrics_history", [])
+    previous = st.session_state.get("metrics_current")
+    if previous is not None:
+        history.append(previous)
+        del history[:-METRICS_HISTORY_LIMIT]
+    record = _new_metrics_record(f"#{len(history) + 1}")
+    st.session_state.metrics_current = record
+    _metrics_local.record = record
+    return record
+
+def end_rerun_metrics(page):
+    record = st.session_state.get("metrics_current")
+    if record is not None:
+        record["page"] = page
+        record["ended"] = time.time()
+    return record
+
+def marks_cache_miss(func):
+    @functools.wraps(func)
+    def body(*args, **kwargs):
+        _metrics_local.cache_miss = True
+        return func(*args, **kwargs)
+    return body
 
+def instrument_loader(loader):
+    name = getattr(loader, "__name__", repr(loader))
+    @functools.wraps(loader)
+    def call(*args, **kwargs):
+        outer_miss = getattr(_metrics_local, "cache_miss", False)
+        _metrics_local.cache_miss = False
+        started = time.perf_counter()
+        try:
+            return loader(*args, **kwargs)
+        finally:
+            miss = _metrics_local.cache_miss
+            _metrics_local.cache_miss = outer_miss or miss
+            record_metric(f"cache.{name}", calls=1, seconds=time.perf_counter() - started, hit=not miss)
+    call.clear = getattr(loader, "clear", None)
+    return call
+
+def _payload_size(value):
+    if isinstance(value, str):
+        return len(value) + 1
+    if isinstance(value, dict):
+        return sum(len(str(k)) + 1 + _payload_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_size(v) for v in value)
+    return 8
+
+def _document_size(doc):
+    data = getattr(doc, "_data", None)
+    if data is None and getattr(doc, "exists", True):
+        data = doc.to_dict()
+    return len(doc.id) + 33 + _payload_size(data or {})
+
+def _unwrap(value):
+    if isinstance(value, InstrumentedClient):
+        return value._target
+    if isinstance(value, (list, tuple)) and any(isinstance(v, InstrumentedClient) for v in value):
+        return type(value)(_unwrap(v) for v in value)
+    return value
+
+class InstrumentedClient:
+
+    def __init__(self, target, backend, kind=None):
+        self._target = target
+        self._backend = backend
+        self._kind = kind
+        self._pending = [0, 0]
+
+    def __bool__(self):
+        return bool(self._target)
+
+    def __repr__(self):
+        return f"InstrumentedClient({self._target!r})"
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if self._backend == "gspread" and name in GSPREAD_API_PROPERTIES:
+            record_metric(f"gspread.{name}", calls=1)
+            return InstrumentedClient(attr, self._backend)
+        if not callable(attr):
+            return attr
+        return functools.partial(self._call, name, attr)
+
+    def _wrap(self, value, kind=None):
+        return InstrumentedClient(value, self._backend, kind) if value is not None else None
+
+    def _call(self, name, method, *args, **kwargs):
+        args = [_unwrap(a) for a in args]
+        kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+        started = time.perf_counter()
+        result = method(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        handler = _gspread_result if self._backend == "gspread" else _firestore_result
+        return handler(self, name, result, args, elapsed)
+
+    def _stream(self, key, docs, started_elapsed):
+        reads, nbytes, elapsed = 0, 0, started_elapsed
+        iterator = iter(docs)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    doc = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                reads += 1
+                nbytes += _document_size(doc)
+                yield doc
+        finally:
+            record_metric(key, calls=1, reads=reads, nbytes=nbytes, seconds=elapsed)
+
+def _gspread_result(proxy, name, result, args, elapsed):
+    key = f"gspread.{name}"
+    if name in ("open", "open_by_key", "open_by_url", "worksheet", "add_worksheet"):
+        record_metric(key, calls=1, seconds=elapsed)
+        return proxy._wrap(result)
+    if name == "worksheets":
+        record_metric(key, calls=1, seconds=elapsed)
+        return [proxy._wrap(ws) for ws in result]
+    if name in GSPREAD_READ_METHODS:
+        record_metric(key, calls=1, reads=len(result or []), nbytes=_payload_size(result), seconds=elapsed)
+    elif name in GSPREAD_WRITE_METHODS:
+        payload = args[0] if args else None
+        if name == "append_row":
+            rows = 1
+        elif name == "batch_update":
+            rows = sum(len(u.get("values", [])) for u in payload or [])
+        elif isinstance(payload, list):
+            rows = len(payload)
+        else:
+            rows = 0
+        record_metric(key, calls=1, writes=rows, nbytes=_payload_size(payload), seconds=elapsed)
+    return result
+
+def _firestore_result(proxy, name, result, args, elapsed):
+    key = f"firestore.{name}"
+    if proxy._kind == "batch" and name in ("set", "update", "delete", "create"):
+        proxy._pending[0] += 1
+        proxy._pending[1] += _payload_size(args[1]) if len(args) > 1 else 0
+        return result
+    if proxy._kind == "batch" and name == "commit":
+        (writes, nbytes), proxy._pending = proxy._pending, [0, 0]
+        record_metric(key, calls=1, writes=writes, nbytes=nbytes, seconds=elapsed)
+        return result
+    if name in FIRESTORE_CHAIN_METHODS:
+        return proxy._wrap(result)
+    if name == "batch":
+        return proxy._wrap(result, "batch")
+    if name == "count":
+        return proxy._wrap(result, "aggregation")
+    if proxy._kind == "aggregation" and name == "get":
+        record_metric(key, calls=1, reads=1, seconds=elapsed)
+        return result
+    if name in ("stream", "get_all"):
+        return proxy._stream(key, result, elapsed)
+    if name == "get":
+        docs = result if isinstance(result, list) else [result]
+        record_metric(key, calls=1, reads=len(docs), nbytes=sum(_document_size(d) for d in docs), seconds=elapsed)
+        return result
+    if name == "list_documents":
+        refs = list(result)
+        record_metric(key, calls=1, reads=len(refs), seconds=elapsed)
+        return [proxy._wrap(ref) for ref in refs]
+    if name in ("set", "update", "delete", "create", "add"):
+        record_metric(key, calls=1, writes=1, nbytes=_payload_size(args[0]) if args else 0, seconds=elapsed)
+        if name == "add":
+            return result[0], proxy._wrap(result[1])
+    return result
+
+def instrument_client(client, backend):
+    return InstrumentedClient(client, backend) if client is not None else None
+
+def metrics_totals(record):
+    totals = dict.fromkeys(METRIC_FIELDS, 0)
+    for m in record["functions"].values():
+        for field in METRIC_FIELDS:
+            totals[field] += m[field]
+    return totals
+
+def metrics_records():
+    records = list(st.session_state.get("metrics_history", []))
+    if st.session_state.get("metrics_current") is not None:
+        records.append(st.session_state.metrics_current)
+    return records + [session_background_metrics()]
+
+def metrics_jsonl(records):
+    session_id = st.session_state.setdefault("metrics_session", uuid.uuid4().hex[:8])
+    lines = []
+    with _metrics_lock():
+        for record in records:
+            wall = (record["ended"] or record["started"]) - record["started"]
+            for function, m in sorted(record["functions"].items()):
+                lines.append(json.dumps({
+                    "session": session_id, "rerun": record["label"], "page": record["page"],
+                    "started": datetime.fromtimestamp(record["started"]).isoformat(timespec="milliseconds"),
+                    "wall_s": round(wall, 4), "function": function, **m,
+                }, ensure_ascii=False))
+    return "\n".join(lines) + "\n"
+
+CACHE_DEPENDENCIES = {}
+
+def depends_on(*sources, invalidate=None):
+    def register(loader):
+        for source in sources:
+            CACHE_DEPENDENCIES.setdefault(source, []).append(invalidate or loader.clear)
+        return instrument_loader(loader)
+    return register
+
+def invalidate_caches(*sources):
+    for source in sources:
+        for invalidate in CACHE_DEPENDENCIES.get(source, []):
+            invalidate()
+
+FIRESTORE_MIGRATIONS = {}
+
+def migration(step, label):
+    def register(run):
+        FIRESTORE_MIGRATIONS[step] = (label, run)
+        return run
+    return register
+
+@depends_on(FIRESTORE_META)
 @st.cache_data(ttl=300)
+@marks_cache_miss
+def get_completed_migrations_fs(_db):
+    if _db is None:
+        return frozenset()
+    try:
+        snap = _db.collection(FIRESTORE_META).document(FIRESTORE_MIGRATIONS_DOC).get()
+        return frozenset(snap.to_dict().get("completed", {})) if snap.exists else frozenset()
+    except Exception:
+        return frozenset()
+
+def migration_done(db, step):
+    return step in get_completed_migrations_fs(db)
+
+def pending_migrations(db):
+    completed = get_completed_migrations_fs(db)
+    return [step for step in FIRESTORE_MIGRATIONS if step not in completed]
+
+def run_migrations_fs(db, on_progress=None):
+    done = []
+    for step in pending_migrations(db):
+        FIRESTORE_MIGRATIONS[step][1](db, on_progress)
+        db.collection(FIRESTORE_META).document(FIRESTORE_MIGRATIONS_DOC).set(
+            {"completed": {step: datetime.now(HUNGARY_TZ).strftime(FIRESTORE_TIMESTAMP_FORMAT)}}, merge=True)
+        invalidate_caches(FIRESTORE_META)
+        done.append(step)
+    return done
+
+@depends_on(GSHEET_NAME)
+@st.cache_data(ttl=300)
+@marks_cache_miss
 def get_attendance_rows_gs(_client):
     if _client is None:
         return []
     try:
-        return _client.open(GSHEET_NAME).sheet1.get_all_values()
+        return sheet_worksheet(_client).get_all_values()
     except Exception:
+        reset_sheet_handles()
         return []
 
-@st.cache_data(ttl=60)
+@st.cache_resource
+def _attendance_snapshot():
+    return {"lock": threading.Lock(), "rows": {}, "watermark": ATTENDANCE_WATERMARK_START, "df": None,
+            "loaded_at": 0.0, "refreshed_at": 0.0}
+
+def _attendance_row(doc_id, d):
+    return [doc_id, d.get("name"), d.get("status"), d.get("timestamp"), d.get("event_date"), d.get("mode", "ismeretlen")]
+
+def _merge_attendance_docs(snap, docs):
+    for doc in docs:
+        d = doc.to_dict()
+        snap["rows"][doc.id] = _attendance_row(doc.id, d)
+        updated_at = d.get("updated_at")
+        if isinstance(updated_at, datetime) and updated_at > snap["watermark"]:
+            snap["watermark"] = updated_at
+    snap["df"] = None
+
+def _full_attendance_load(col, snap):
+    snap["rows"] = {}
+    snap["watermark"] = ATTENDANCE_WATERMARK_START
+    _merge_attendance_docs(snap, col.select(ATTENDANCE_FIELDS + ["updated_at"]).stream())
+
+def _refresh_attendance_snapshot(db, snap):
+    now = time.time()
+    col = db.collection(FIRESTORE_COLLECTION)
+    if now - snap["refreshed_at"] <= ATTENDANCE_REFRESH_SECONDS:
+        return
+    _metrics_local.cache_miss = True
+    if not snap["loaded_at"] or now - snap["loaded_at"] > ATTENDANCE_FULL_RESYNC_SECONDS:
+        _full_attendance_load(col, snap)
+        snap["loaded_at"] = now
+    else:
+        delta = (col.select(ATTENDANCE_FIELDS + ["updated_at"])
+                    .where(filter=firestore.FieldFilter("updated_at", ">=", snap["watermark"])))
+        _merge_attendance_docs(snap, delta.stream())
+        if col.count().get()[0][0].value != len(snap["rows"]):
+            _full_attendance_load(col, snap)
+            snap["loaded_at"] = now
+    snap["refreshed_at"] = now
+
+@depends_on(FIRESTORE_COLLECTION, invalidate=lambda: expire_attendance_cache())
 def get_attendance_rows_fs(_db):
     if _db is None:
-        return pd.DataFrame(columns=["ID", "Név", "Jön-e", "Regisztráció Időpontja", "Alkalom Dátuma", "Mód"])
-    try:
-        docs = _db.collection(FIRESTORE_COLLECTION).order_by("timestamp", direction=firestore.Query.DESCENDING).stream()
-        data = []
-        for doc in docs:
+        return pd.DataFrame(columns=ATTENDANCE_FS_COLUMNS)
+    snap = _attendance_snapshot()
+    with snap["lock"]:
+        try:
+            _refresh_attendance_snapshot(_db, snap)
+        except Exception as e:
+            st.error(f"Hiba a Firestore adatok betöltésekor: {e}")
+            if not snap["loaded_at"]:
+                return pd.DataFrame(columns=ATTENDANCE_FS_COLUMNS)
+        if snap["df"] is None:
+            df = pd.DataFrame(list(snap["rows"].values()), columns=ATTENDANCE_FS_COLUMNS)
+            snap["df"] = df.sort_values(by="Regisztráció Időpontja", ascending=False, kind="stable").reset_index(drop=True)
+        return snap["df"].copy()
+
+def apply_attendance_cache_changes(deleted_ids=(), updated=None, added=None):
+    snap = _attendance_snapshot()
+    with snap["lock"]:
+        if not snap["loaded_at"]:
+            return
+        for doc_id in deleted_ids:
+            snap["rows"].pop(doc_id, None)
+        field_pos = {"name": 1, "status": 2, "timestamp": 3, "event_date": 4, "mode": 5}
+        for doc_id, fields in (updated or {}).items():
+            if doc_id in snap["rows"]:
+                for k, v in fields.items():
+                    if k in field_pos:
+                        snap["rows"][doc_id][field_pos[k]] = v
+        for doc_id, fields in (added or {}).items():
+            snap["rows"][doc_id] = _attendance_row(doc_id, fields)
+        snap["df"] = None
+
+def expire_attendance_cache():
+    snap = _attendance_snapshot()
+    with snap["lock"]:
+        snap["refreshed_at"] = 0.0
+
+def reset_attendance_cache():
+    snap = _attendance_snapshot()
+    with snap["lock"]:
+        snap["rows"] = {}
+        snap["watermark"] = ATTENDANCE_WATERMARK_START
+        snap["df"] = None
+        snap["loaded_at"] = 0.0
+        snap["refreshed_at"] = 0.0
+
+def _attendance_docs_to_df(docs):
+    data = [_attendance_row(doc.id, doc.to_dict()) for doc in docs]
+    df = pd.DataFrame(data, columns=ATTENDANCE_FS_COLUMNS)
+    return df.sort_values(by="Regisztráció Időpontja", ascending=False, kind="stable").reset_index(drop=True)
+
+def _stream_attendance_window_fs(db, start_date, end_date):
+    col = db.collection(FIRESTORE_COLLECTION).select(ATTENDANCE_FIELDS)
+    if not migration_done(db, "canonical_dates"):
+        docs = []
+        for doc in col.stream():
             d = doc.to_dict()
-            data.append([doc.id, d.get("name"), d.get("status"), d.get("timestamp"), d.get("event_date"), d.get("mode", "ismeretlen")])
-        return pd.DataFrame(data, columns=["ID", "Név", "Jön-e", "Regisztráció Időpontja", "Alkalom Dátuma", "Mód"])
+            session_date = record_session_date(d.get("event_date"), d.get("timestamp"))
+            if session_date is not None and start_date <= session_date <= end_date:
+                docs.append(doc)
+        return docs
+    lo = start_date.strftime(FIRESTORE_DATE_KEY_FORMAT)
+    hi = end_date.strftime(FIRESTORE_DATE_KEY_FORMAT)
+    by_event = (col.where(filter=firestore.FieldFilter("event_date", ">=", lo))
+                   .where(filter=firestore.FieldFilter("event_date", "<=", hi)))
+    docs = {doc.id: doc for doc in by_event.stream()}
+    by_timestamp = (col.where(filter=firestore.FieldFilter("timestamp", ">=", lo))
+                       .where(filter=firestore.FieldFilter("timestamp", "<=", hi + "\uf8ff")))
+    for doc in by_timestamp.stream():
+        if doc.id not in docs and parse_date_str(doc.to_dict().get("event_date")) is None:
+            docs[doc.id] = doc
+    return list(docs.values())
+
+@depends_on(FIRESTORE_COLLECTION)
+@st.cache_data(ttl=60)
+@marks_cache_miss
+def get_attendance_rows_fs_range(_db, start_date, end_date):
+    if _db is None:
+        return pd.DataFrame(columns=ATTENDANCE_FS_COLUMNS)
+    try:
+        return _attendance_docs_to_df(_stream_attendance_window_fs(_db, start_date, end_date))
     except Exception as e:
         st.error(f"Hiba a Firestore adatok betöltésekor: {e}")
-        return pd.DataFrame(columns=["ID", "Név", "Jön-e", "Regisztráció Időpontja", "Alkalom Dátuma", "Mód"])
+        return pd.DataFrame(columns=ATTENDANCE_FS_COLUMNS)
 
-def get_historical_guests_list(rows, main_name):
-    if not rows:
-        return []
-    prefix = f"{main_name} - "
-    guests = set()
+def _backfill_attendance_fs(db, fix, on_progress=None):
+    col = db.collection(FIRESTORE_COLLECTION)
+    updated = {}
+    for doc in col.select(ATTENDANCE_FIELDS).stream():
+        fields = fix(doc.to_dict())
+        if fields:
+            updated[doc.id] = fields
+    elapsed = commit_ops_with_progress(db, [("update", col.document(doc_id), stamp_updated(fields))
+                                            for doc_id, fields in updated.items()], on_progress)
+    apply_attendance_cache_changes(updated=updated)
+    invalidate_caches(FIRESTORE_COLLECTION)
+    return len(updated), elapsed
+
+@migration("canonical_dates", "Dátumok egységes formátumra alakítása")
+def migrate_canonical_dates_fs(db, on_progress=None):
+    def fix(d):
+        fields = {k: d.get(k) for k in ("event_date", "timestamp") if d.get(k)}
+        canonical = canonical_attendance_fields(fields)
+        return {k: v for k, v in canonical.items() if v != fields[k]}
+    return _backfill_attendance_fs(db, fix, on_progress)
+
+ATTENDANCE_FIELD_DEFAULTS = {"name": "", "status": "", "timestamp": "", "event_date": "", "mode": "ismeretlen"}
+
+@migration("sort_fields", "Hiányzó mezők feltöltése a lapozható rendezéshez")
+def migrate_attendance_sort_fields_fs(db, on_progress=None):
+    def fix(d):
+        return {k: default for k, default in ATTENDANCE_FIELD_DEFAULTS.items() if d.get(k) is None}
+    return _backfill_attendance_fs(db, fix, on_progress)
+
+def attendance_paging_ready(db):
+    return migration_done(db, "canonical_dates") and migration_done(db, "sort_fields")
+
+def attendance_page_query(db, sort_field, descending, name=None, mode=None, date_range=None):
+    query = db.collection(FIRESTORE_COLLECTION).select(ATTENDANCE_FIELDS)
+    if name:
+        query = query.where(filter=firestore.FieldFilter("name", "==", name))
+    if mode:
+        query = query.where(filter=firestore.FieldFilter("mode", "==", mode))
+    direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+    if not date_range:
+        return query.order_by(sort_field, direction=direction)
+    start_date, end_date = date_range
+    return (query.where(filter=firestore.FieldFilter("event_date", ">=", start_date.strftime(FIRESTORE_DATE_KEY_FORMAT)))
+                 .where(filter=firestore.FieldFilter("event_date", "<=", end_date.strftime(FIRESTORE_DATE_KEY_FORMAT)))
+                 .order_by("event_date", direction=direction))
+
+def fetch_attendance_page(query, cursor, page_size):
+    if cursor is not None:
+        query = query.start_after(cursor)
+    docs = list(query.limit(page_size + 1).stream())
+    page = docs[:page_size]
+    df = pd.DataFrame([_attendance_row(doc.id, doc.to_dict()) for doc in page], columns=ATTENDANCE_FS_COLUMNS)
+    return df, page[-1] if page else cursor, len(docs) > page_size
+
+def fetch_snapshot_attendance_page(df, sort_field, descending, offset, page_size, name=None, mode=None, date_range=None):
+    if name:
+        df = df[df["Név"] == name]
+    if mode:
+        df = df[df["Mód"] == mode]
+    if date_range:
+        df = df.assign(_date=parse_date_series(df["Alkalom Dátuma"]))
+        df = df[df["_date"].map(lambda d: d is not None and date_range[0] <= d <= date_range[1])]
+        column = "_date"
+    else:
+        column = {v: k for k, v in ATTENDANCE_SORT_FIELDS.items()}[sort_field]
+    df = df.sort_values(column, ascending=not descending, kind="stable", na_position="last")
+    page = df.iloc[offset:offset + page_size][ATTENDANCE_FS_COLUMNS].reset_index(drop=True)
+    return page, offset + len(page), len(df) > offset + page_size
+
+def build_guest_index(rows):
+    index = {}
     for row in rows[1:]:
-        if row and row[0].startswith(prefix):
-            guest_part = row[0].replace(prefix, "", 1).strip()
+        if not row:
+            continue
+        full_name = row[0]
+        pos = full_name.find(" - ")
+        while pos != -1:
+            guest_part = full_name[pos + 3:].strip()
             if guest_part:
-                guests.add(guest_part)
-    return sorted(list(guests))
+                index.setdefault(full_name[:pos], set()).add(guest_part)
+            pos = full_name.find(" - ", pos + 1)
+    return {host: sorted(guests) for host, guests in index.items()}
+
+@depends_on(GSHEET_NAME)
+@st.cache_data(ttl=300)
+@marks_cache_miss
+def get_guest_index_gs(_client):
+    return build_guest_index(get_attendance_rows_gs(_client))
 
 def build_total_attendance(rows, year=None):
-    status_by_name_date = {}
-    for row in rows[1:]:
-        name = row[0].strip() if len(row) > 0 else ""
-        response = row[1].strip() if len(row) > 1 else ""
-        evt = row[3].strip() if len(row) > 3 else ""
-        reg = row[2].strip() if len(row) > 2 else ""
-        if not name or response not in {"Yes", "No"}:
-            continue
-        record_date = parse_date_str(evt) or parse_date_str(reg)
-        if record_date is None:
-            continue
-        if year is not None and record_date.year != year:
+    if len(rows) < 2:
+        return {}
+    df = pd.DataFrame(rows[1:]).reindex(columns=range(4))
+    names = df[0].where(df[0].notna(), "").astype(str).str.strip()
+    statuses = df[1].where(df[1].notna(), "").astype(str).str.strip()
+    dates = parse_date_series(df[3])
+    missing = dates.isna() & (names != "")
+    if missing.any():
+        dates[missing] = parse_date_series(df.loc[missing, 2])
+    mask = (names != "") & statuses.isin(["Yes", "No"]) & dates.notna()
+    if year is not None and mask.any():
+        mask &= pd.to_datetime(dates.where(mask)).dt.year == year
+    if not mask.any():
+        return {}
+    flags = pd.DataFrame({"name": names[mask], "date": dates[mask], "yes": statuses[mask] == "Yes",
+                          "no": statuses[mask] == "No"}).groupby(["name", "date"], sort=False)[["yes", "no"]].any()
+    final = flags[flags["yes"] & ~flags["no"]].reset_index()
+    return {name: int(count) for name, count in final["name"].value_counts(sort=False).items()}
+
+def build_session_attendees(df_fs):
+    if df_fs.empty:
+        return pd.DataFrame(columns=["date", "name"])
+    names = df_fs["Név"].where(df_fs["Név"].notna(), "").astype(str).str.strip()
+    statuses = df_fs["Jön-e"].where(df_fs["Jön-e"].notna(), "").astype(str).str.strip()
+    modes = df_fs["Mód"].where(df_fs["Mód"].notna(), "valós").astype(str).str.strip().str.lower()
+    evt_dates = parse_date_series(df_fs["Alkalom Dátuma"])
+    reg_dates = parse_date_series(df_fs["Regisztráció Időpontja"])
+    dates = evt_dates.where(evt_dates.notna(), reg_dates)
+    mask = (names != "") & statuses.isin(["Yes", "No"]) & (modes != "teszt") & dates.notna()
+    if not mask.any():
+        return pd.DataFrame(columns=["date", "name"])
+    df = pd.DataFrame({"date": dates[mask], "name": names[mask],
+                       "yes": statuses[mask] == "Yes", "no": statuses[mask] == "No"})
+    flags = df.groupby(["date", "name"], sort=True)[["yes", "no"]].any()
+    final = flags[flags["yes"] & ~flags["no"]].reset_index()
+    return final[["date", "name"]]
+
+def record_session_date(event_date, timestamp):
+    return parse_date_str(event_date) or parse_date_str(timestamp)
+
+def attendance_affected_dates(df, deleted_ids, updated, added):
+    old_rows = df.set_index("ID")
+    dates = set()
+    for doc_id in list(deleted_ids) + list(updated):
+        old = old_rows.loc[doc_id]
+        dates.add(record_session_date(old["Alkalom Dátuma"], old["Regisztráció Időpontja"]))
+        if doc_id in updated:
+            dates.add(record_session_date(updated[doc_id].get("event_date", old["Alkalom Dátuma"]),
+                                          updated[doc_id].get("timestamp", old["Regisztráció Időpontja"])))
+    for data in added.values():
+        dates.add(record_session_date(data["event_date"], data["timestamp"]))
+    return dates
+
+def _session_summary_doc(date_obj, attendees):
+    return {"date": date_obj.strftime("%Y-%m-%d"), "attendees": sorted(attendees), "count": len(attendees),
+            "updated_at": datetime.now(HUNGARY_TZ).strftime("%Y-%m-%d %H:%M:%S")}
+
+def _attendees_by_date(df_fs):
+    df_att = build_session_attendees(df_fs)
+    return df_att.groupby("date")["name"].agg(list).to_dict() if not df_att.empty else {}
+
+def _compute_session_attendees_fs(db, dates):
+    attendees = _attendees_by_date(_attendance_docs_to_df(_stream_attendance_window_fs(db, min(dates), max(dates))))
+    return {d: attendees.get(d, []) for d in dates}
+
+def _leaderboard_ops(db, previous, current):
+    deltas = {}
+    for d in set(previous) | set(current):
+        old_names = set(previous.get(d, []))
+        new_names = set(current.get(d, []))
+        for name in new_names - old_names:
+            deltas.setdefault(d.year, {})[name] = deltas.get(d.year, {}).get(name, 0) + 1
+        for name in old_names - new_names:
+            deltas.setdefault(d.year, {})[name] = deltas.get(d.year, {}).get(name, 0) - 1
+    col = db.collection(FIRESTORE_LEADERBOARD)
+    return [("merge", col.document(str(year)),
+             {"year": year, "counts": {name: firestore.Increment(delta) for name, delta in counts.items() if delta}})
+            for year, counts in deltas.items() if any(counts.values())]
+
+def _write_session_summaries_fs(db, attendees_by_date, previous=None):
+    col = db.collection(FIRESTORE_SESSION_SUMMARIES)
+    refs = {d: col.document(d.strftime("%Y-%m-%d")) for d in attendees_by_date}
+    if previous is None:
+        previous = {}
+        for snap in db.get_all(list(refs.values()), field_paths=["attendees"]):
+            if snap.exists:
+                previous[parse_date_str(snap.id)] = snap.to_dict().get("attendees", [])
+    ops = [("set", refs[d], _session_summary_doc(d, names)) for d, names in attendees_by_date.items()]
+    commit_firestore_ops(db, ops + _leaderboard_ops(db, previous, attendees_by_date))
+
+def update_session_summaries_fs(db, dates):
+    dates = {d for d in dates if d}
+    if not dates:
+        return 0
+    _write_session_summaries_fs(db, _compute_session_attendees_fs(db, dates))
+    invalidate_caches(FIRESTORE_SESSION_SUMMARIES, FIRESTORE_LEADERBOARD)
+    return len(dates)
+
+def _counts_by_year(attendees_by_date, year=None):
+    counts_by_year = {}
+    for d, names in attendees_by_date.items():
+        if year is not None and d.year != year:
             continue
-        key = (name, record_date)
-        status = status_by_name_date.setdefault(key, {"yes": False, "no": False})
-        if response == "Yes":
-            status["yes"] = True
-        else:
-            status["no"] = True
-    totals = {}
-    for (name, _), status in status_by_name_date.items():
-        if status["yes"] and not status["no"]:
-            totals[name] = totals.get(name, 0) + 1
-    return totals
+        year_counts = counts_by_year.setdefault(d.year, {})
+        for name in names:
+            year_counts[name] = year_counts.get(name, 0) + 1
+    return counts_by_year
+
+@migration("session_summaries", "Alkalom-összesítők és ranglista feltöltése")
+def rebuild_session_summaries_fs(db, on_progress=None):
+    attendees = _attendees_by_date(_attendance_docs_to_df(db.collection(FIRESTORE_COLLECTION).select(ATTENDANCE_FIELDS).stream()))
+    docs = [_session_summary_doc(d, names) for d, names in sorted(attendees.items())]
+    count, elapsed = bulk_replace_collection_fs(db, FIRESTORE_SESSION_SUMMARIES, docs, on_progress, id_field="date")
+    bulk_replace_collection_fs(db, FIRESTORE_LEADERBOARD, [{"year": year, "counts": counts}
+                                                           for year, counts in _counts_by_year(attendees).items()],
+                               id_field="year")
+    invalidate_caches(FIRESTORE_SESSION_SUMMARIES, FIRESTORE_LEADERBOARD)
+    return count, elapsed
+
+@depends_on(FIRESTORE_LEADERBOARD)
+@st.cache_data(ttl=300)
+@marks_cache_miss
+def get_leaderboard_counts_fs(_db, year=None):
+    if _db is None:
+        return None
+    try:
+        col = _db.collection(FIRESTORE_LEADERBOARD)
+        snaps = [col.document(str(year)).get()] if year is not None else list(col.stream())
+        return {int(snap.id): snap.to_dict().get("counts", {}) for snap in snaps if snap.exists}
+    except Exception as e:
+        st.error(f"Hiba a ranglista betöltésekor: {e}")
+        return None
+
+def leaderboard_counts(fs_db, year=None):
+    if migration_done(fs_db, "session_summaries"):
+        return get_leaderboard_counts_fs(fs_db, year)
+    return _counts_by_year(_attendees_by_date(get_attendance_rows_fs(fs_db)), year)
+
+@depends_on(FIRESTORE_SESSION_SUMMARIES)
+@st.cache_data(ttl=60)
+@marks_cache_miss
+def get_session_summaries_fs(_db, dates):
+    if _db is None:
+        return None
+    try:
+        col = _db.collection(FIRESTORE_SESSION_SUMMARIES)
+        summaries = {}
+        for snap in _db.get_all([col.document(d.strftime("%Y-%m-%d")) for d in dates], field_paths=["attendees"]):
+            if snap.exists:
+                summaries[parse_date_str(snap.id)] = snap.to_dict().get("attendees", [])
+        missing = [d for d in dates if d not in summaries]
+        if missing:
+            computed = _attendees_by_date(get_attendance_rows_fs_range(_db, min(missing), max(missing)))
+            summaries.update({d: computed.get(d, []) for d in missing})
+        return summaries
+    except Exception as e:
+        st.error(f"Hiba az alkalom-összesítők betöltésekor: {e}")
+        return None
 
+@depends_on(FIRESTORE_CANCELLED)
 @st.cache_data(ttl=60)
+@marks_cache_miss
 def get_cancelled_sessions_fs(_db):
     if _db is None:
         return set()
     try:
-        docs = _db.collection(FIRESTORE_CANCELLED).stream()
-        cancelled = set()
-        for doc in docs:
-            d = doc.to_dict()
-            date_str = d.get("date")
-            if date_str:
-                date_obj = parse_date_str(date_str)
-                if date_obj:
-                    cancelled.add(date_obj)
-        return cancelled
+        return FirestoreRepository(_db).list_cancelled_sessions()
     except Exception:
         return set()
 
+@depends_on(FIRESTORE_INVOICES)
 @st.cache_data(ttl=60)
+@marks_cache_miss
 def get_invoices_fs(_db):
     if _db is None:
         return []
     try:
-        docs = _db.collection(FIRESTORE_INVOICES).stream()
-        invoices = []
-        month_names = ["Január", "Február", "Március", "Április", "Május", "Június",
-                       "Július", "Augusztus", "Szeptember", "Október", "November", "December"]
-        for doc in docs:
-            d = doc.to_dict()
-            d["ID"] = doc.id
-            if "month_name" not in d and "target_month" in d:
-                d["month_name"] = month_names[int(d["target_month"]) - 1]
-            invoices.append(d)
-        invoices.sort(key=lambda x: (int(x.get('target_year', 0)), int(x.get('target_month', 0))), reverse=True)
-        return invoices
+        return FirestoreRepository(_db).list_invoices()
     except Exception:
         return []
 
-def calculate_monthly_accounting_fs(fs_db, inv_dict):
+def _invoice_session_dates(inv_dict, cancelled_dates):
+    all_tuesdays = get_tuesdays_in_month(int(inv_dict["target_year"]), int(inv_dict["target_month"]))
+    return [d for d in all_tuesdays if d not in cancelled_dates]
+
+def _accounting_from_summaries(inv_dict, session_dates, summaries):
     target_year = int(inv_dict["target_year"])
-    target_month = int(inv_dict["target_month"])
     target_month_name = inv_dict["month_name"]
-    total_amount = float(inv_dict["amount"])
-    all_tuesdays = get_tuesdays_in_month(target_year, target_month)
-    cancelled_dates = get_cancelled_sessions_fs(fs_db)
-    session_dates = [d for d in all_tuesdays if d not in cancelled_dates]
     if not session_dates:
         return False, f"Nincsenek érvényes edzésnapok {target_year}. {target_month_name} hónapban.", None, None, None, None
-    cost_per_session = total_amount / len(session_dates)
-    df_fs = get_attendance_rows_fs(fs_db)
-    processed_att = []
-    if not df_fs.empty:
-        for _, row in df_fs.iterrows():
-            name = str(row["Név"]).strip() if pd.notna(row["Név"]) else ""
-            is_coming = str(row["Jön-e"]).strip() if pd.notna(row["Jön-e"]) else ""
-            if not name or not is_coming:
-                continue
-            mode_val = str(row["Mód"]).strip().lower() if pd.notna(row["Mód"]) else "valós"
-            if mode_val == "teszt":
-                continue
-            reg_val = str(row["Regisztráció Időpontja"]) if pd.notna(row["Regisztráció Időpontja"]) else ""
-            evt_val = str(row["Alkalom Dátuma"]) if pd.notna(row["Alkalom Dátuma"]) else ""
-            rel_date = parse_date_str(evt_val) or parse_date_str(reg_val)
-            if rel_date:
-                processed_att.append({"name": name, "is_coming": is_coming, "date": rel_date})
+    cost_per_session = float(inv_dict["amount"]) / len(session_dates)
+    attendees_by_date = {d: set(names) for d, names in summaries.items()}
     elszamolas_data = []
     person_totals = {}
     person_counts = {}
     for s_date in session_dates:
-        yes_set = set()
-        no_set = set()
-        for rec in processed_att:
-            if rec["date"] == s_date:
-                if rec["is_coming"] == "Yes":
-                    yes_set.add(rec["name"])
-                elif rec["is_coming"] == "No":
-                    no_set.add(rec["name"])
-        final_attendees = yes_set - no_set
+        final_attendees = attendees_by_date.get(s_date, set())
         attendee_count = len(final_attendees)
         cost_per_person = cost_per_session / attendee_count if attendee_count > 0 else 0
         elszamolas_data.append({
@@ -334,95 +1264,314 @@ def calculate_monthly_accounting_fs(fs_db, inv_dict):
     ]
     return True, "Siker", pd.DataFrame(elszamolas_data), pd.DataFrame(osszesito_data), target_month_name, target_year
 
-def generate_pdf_bytes(df_osszesito, month_name, year):
+def _accounting_cancelled_dates(fs_db, replica=None):
+    return replica.list_cancelled_sessions() if replica else get_cancelled_sessions_fs(fs_db)
+
+def _accounting_attendees(fs_db, dates, replica=None):
+    if replica is None:
+        return get_session_summaries_fs(fs_db, dates)
+    attendees = _attendees_by_date(replica.list_attendance(min(dates), max(dates)))
+    return {d: attendees.get(d, []) for d in dates}
+
+def calculate_monthly_accounting_fs(fs_db, inv_dict, replica=None):
+    session_dates = _invoice_session_dates(inv_dict, _accounting_cancelled_dates(fs_db, replica))
+    if not session_dates:
+        return _accounting_from_summaries(inv_dict, session_dates, {})
+    summaries = _accounting_attendees(fs_db, tuple(session_dates), replica)
+    if summaries is None:
+        return False, "Nem sikerült betölteni a jelenléti adatokat.", None, None, None, None
+    return _accounting_from_summaries(inv_dict, session_dates, summaries)
+
+def invoice_label(inv_dict):
+    return f"{inv_dict['target_year']}. {inv_dict['month_name']}"
+
+def _unique_invoice_labels(invoices):
+    labels = [invoice_label(inv) for inv in invoices]
+    totals = {label: labels.count(label) for label in labels}
+    seen = {}
+    unique = []
+    for label in labels:
+        seen[label] = seen.get(label, 0) + 1
+        unique.append(f"{label} ({seen[label]}. számla)" if totals[label] > 1 else label)
+    return unique
+
+def calculate_batch_accounting_fs(fs_db, invoices, replica=None):
+    invoices = sorted(invoices, key=lambda x: (int(x["target_year"]), int(x["target_month"])))
+    cancelled_dates = _accounting_cancelled_dates(fs_db, replica)
+    dates_by_invoice = [_invoice_session_dates(inv, cancelled_dates) for inv in invoices]
+    all_dates = tuple(sorted({d for dates in dates_by_invoice for d in dates}))
+    summaries = _accounting_attendees(fs_db, all_dates, replica) if all_dates else {}
+    if summaries is None:
+        return False, "Nem sikerült betölteni a jelenléti adatokat.", None, None, None
+    labels = _unique_invoice_labels(invoices)
+    months = []
+    month_rows = []
+    person_frames = []
+    for inv, dates, label in zip(invoices, dates_by_invoice, labels):
+        result = _accounting_from_summaries(inv, dates, {d: summaries.get(d, []) for d in dates})
+        months.append((inv, result))
+        success, msg, _, df_osszesito = result[:4]
+        month_rows.append({
+            "Hónap": label, "Alkalmak": len(dates),
+            "Részvételek": int(df_osszesito["Részvétel száma"].sum()) if success and not df_osszesito.empty else 0,
+            "Résztvevők": len(df_osszesito) if success else 0,
+            "Számla (Ft)": float(inv["amount"]), "Megjegyzés": "" if success else msg,
+        })
+        if success and not df_osszesito.empty:
+            person_frames.append(df_osszesito.assign(Számla=len(month_rows) - 1))
+    df_months = pd.DataFrame(month_rows)
+    if not person_frames:
+        return False, "A kiválasztott hónapokban nem volt elszámolható részvétel.", df_months, None, months
+    people = pd.concat(person_frames, ignore_index=True)
+    df_people = people.groupby("Név", as_index=False)[["Részvétel száma", "Fizetendő (Ft)"]].sum()
+    per_invoice = people.pivot_table(index="Név", columns="Számla", values="Fizetendő (Ft)", aggfunc="sum")
+    df_people = df_people.join(per_invoice.rename(columns=dict(enumerate(labels))), on="Név")
+    df_people = df_people.sort_values("Név").reset_index(drop=True)
+    return True, "Siker", df_months, df_people, months
+
+@st.cache_resource
+def _pdf_font_template():
+    if not all(os.path.exists(path) for path in PDF_FONT_FILES.values()):
+        return None
+    try:
+        template = FPDF()
+        for style, path in PDF_FONT_FILES.items():
+            template.add_font("Roboto", style, path)
+        font_files = {}
+        for key, font in template.fonts.items():
+            buf = io.BytesIO()
+            font.ttfont.save(buf)
+            font.ttfont.close()
+            font_files[key] = buf.getvalue()
+        return template.fonts, font_files
+    except Exception as e:
+        print(f"Betűtípus betöltési hiba: {e}")
+        return None
+
+def _new_pdf_document():
     pdf = FPDF()
-    pdf.add_page()
-    has_custom_font = False
-    font_path = "Roboto-Regular.ttf"
-    font_bold_path = "Roboto-Bold.ttf"
-    if os.path.exists(font_path) and os.path.exists(font_bold_path):
-        try:
-            try:
-                pdf.add_font("Roboto", "", font_path, uni=True)
-                pdf.add_font("Roboto", "B", font_bold_path, uni=True)
-            except TypeError:
-                pdf.add_font("Roboto", "", font_path)
-                pdf.add_font("Roboto", "B", font_bold_path)
-            has_custom_font = True
-        except Exception as e:
-            print(f"Betűtípus betöltési hiba: {e}")
-    def safe_txt(t):
-        t_str = str(t)
-        if has_custom_font:
-            return t_str
-        t_str = t_str.replace('ő', 'ö').replace('ű', 'ü').replace('Ő', 'Ö').replace('Ű', 'Ü')
-        return t_str.encode('latin-1', 'replace').decode('latin-1')
+    template = _pdf_font_template()
+    if template is not None:
+        fonts, font_files = template
+        for key, font in fonts.items():
+            font = copy.deepcopy(font)
+            font.ttfont = TTFont(io.BytesIO(font_files[key]), recalcTimestamp=False, lazy=True)
+            pdf.fonts[key] = font
+    return pdf, template is not None
+
+def _pdf_safe_text(t, has_custom_font):
+    t_str = str(t)
+    if has_custom_font:
+        return t_str
+    t_str = t_str.replace('ő', 'ö').replace('ű', 'ü').replace('Ő', 'Ö').replace('Ű', 'Ü')
+    return t_str.encode('latin-1', 'replace').decode('latin-1')
+
+def _render_pdf_table(pdf, has_custom_font, columns, rows):
     font_family = "Roboto" if has_custom_font else "Arial"
-    pdf.set_font(font_family, "B", 16)
-    pdf.cell(0, 10, txt=safe_txt(f"Havi Röplabda Elszámolás - {year}. {month_name}"), ln=True, align='C')
-    pdf.ln(10)
     pdf.set_font(font_family, "B", 12)
-    pdf.cell(90, 10, safe_txt("Név"), border=1)
-    pdf.cell(40, 10, safe_txt("Részvétel száma"), border=1, align='C')
-    pdf.cell(50, 10, safe_txt("Fizetendő"), border=1, align='R')
+    for title, width, align in columns:
+        pdf.cell(width, 10, _pdf_safe_text(title, has_custom_font), border=1, align=align)
     pdf.ln()
     pdf.set_font(font_family, "", 12)
-    for _, row in df_osszesito.iterrows():
-        pdf.cell(90, 10, safe_txt(row['Név']), border=1)
-        pdf.cell(40, 10, str(row['Részvétel száma']), border=1, align='C')
-        pdf.cell(50, 10, safe_txt(f"{row['Fizetendő (Ft)']:.0f} Ft"), border=1, align='R')
+    for values in rows:
+        for value, (_, width, align) in zip(values, columns):
+            pdf.cell(width, 10, _pdf_safe_text(value, has_custom_font), border=1, align=align)
         pdf.ln()
+
+def _render_pdf_summary_table(pdf, has_custom_font, df_osszesito):
+    rows = zip(df_osszesito["Név"], df_osszesito["Részvétel száma"], df_osszesito["Fizetendő (Ft)"])
+    _render_pdf_table(pdf, has_custom_font, PDF_TABLE_COLUMNS,
+                      ([name, str(count), f"{amount:.0f} Ft"] for name, count, amount in rows))
+
+def _render_pdf_title(pdf, has_custom_font, title):
+    pdf.set_font("Roboto" if has_custom_font else "Arial", "B", 16)
+    pdf.cell(0, 10, txt=_pdf_safe_text(title, has_custom_font), ln=True, align='C')
+    pdf.ln(10)
+
+def _pdf_output_bytes(pdf):
     try:
-        return pdf.output(dest='S').encode('latin-1')
+        out = pdf.output(dest='S')
     except TypeError:
-        return pdf.output()
-    except AttributeError:
-        return bytes(pdf.output())
+        out = pdf.output()
+    return out.encode('latin-1') if isinstance(out, str) else bytes(out)
 
-def _get_smtp_connection():
+def generate_pdf_bytes(df_osszesito, month_name, year):
+    pdf, has_custom_font = _new_pdf_document()
+    pdf.add_page()
+    _render_pdf_title(pdf, has_custom_font, f"Havi Röplabda Elszámolás - {year}. {month_name}")
+    _render_pdf_summary_table(pdf, has_custom_font, df_osszesito)
+    return _pdf_output_bytes(pdf)
+
+def generate_batch_pdf_bytes(df_months, df_people, months, title):
+    pdf, has_custom_font = _new_pdf_document()
+    pdf.add_page()
+    _render_pdf_title(pdf, has_custom_font, f"Röplabda Elszámolás - {title}")
+    _render_pdf_table(pdf, has_custom_font, PDF_MONTH_COLUMNS, (
+        [row["Hónap"], str(row["Alkalmak"]), str(row["Részvételek"]), f"{row['Számla (Ft)']:.0f} Ft"]
+        for row in df_months.to_dict("records")))
+    pdf.ln(10)
+    _render_pdf_summary_table(pdf, has_custom_font, df_people)
+    for _, (success, _, _, df_osszesito, month_name, year) in months:
+        if success and not df_osszesito.empty:
+            pdf.add_page()
+            _render_pdf_title(pdf, has_custom_font, f"Havi Röplabda Elszámolás - {year}. {month_name}")
+            _render_pdf_summary_table(pdf, has_custom_font, df_osszesito)
+    return _pdf_output_bytes(pdf)
+
+def _smtp_settings():
+    email_cfg = st.secrets["email"]
+    return {
+        "sender": email_cfg["sender"], "password": email_cfg.get("password", ""),
+        "host": email_cfg.get("smtp_host", SMTP_HOST), "port": int(email_cfg.get("smtp_port", SMTP_PORT)),
+        "ssl": bool(email_cfg.get("smtp_ssl", True)),
+        "rate_per_second": float(email_cfg.get("max_per_second", EMAIL_RATE_PER_SECOND)),
+    }
+
+def _get_smtp_connection(settings=None):
     try:
-        sender = st.secrets["email"]["sender"]
-        password = st.secrets["email"]["password"]
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(sender, password)
-        return server, sender
+        settings = settings or _smtp_settings()
+        if settings["ssl"]:
+            server = smtplib.SMTP_SSL(settings["host"], settings["port"])
+        else:
+            server = smtplib.SMTP(settings["host"], settings["port"])
+            if settings["password"]:
+                server.starttls()
+        if settings["password"]:
+            server.login(settings["sender"], settings["password"])
+        return server, settings["sender"]
+    except smtplib.SMTPAuthenticationError:
+        raise
     except Exception as e:
         raise Exception(f"SMTP kapcsolódási hiba: {e}")
 
-def send_personal_email(to_address, name, month_name, year, count, amount, own_count=None, guest_names=None):
+def _close_smtp_connection(server):
     try:
-        server, sender = _get_smtp_connection()
-        msg = MIMEMultipart("alternative")
-        msg["From"] = f"Röpi App 🏐 <{sender}>"
-        msg["To"] = to_address
-        msg["Subject"] = f"🏐 Röpi elszámolás — {year}. {month_name}"
-        keresztnev = name.split()[0]
-        has_guests = guest_names and guest_names != "—" and guest_names != ""
-        guest_row = f"""<tr style="background:#fff8e1;"><td style="padding:10px; color:#888;">🧑‍🤝‍🧑 Vendégek</td><td style="padding:10px; text-align:right; color:#888;">{guest_names}</td></tr>""" if has_guests else ""
-        own_row = f"""<tr style="background:#f9f9f9;"><td style="padding:10px; color:#555;">👤 Saját részvétel</td><td style="padding:10px; text-align:right; color:#555;">{own_count} alkalom</td></tr>""" if (own_count is not None and has_guests) else ""
-        html_body = f"""<html><body style="font-family: Arial, sans-serif; color: #333; max-width: 520px; margin: auto;">
-          <div style="background: #f8f8f8; border-radius: 12px; padding: 28px;">
-            <h2 style="color: #4a90d9; margin-top:0;">🏐 Havi Röpi Elszámolás</h2>
-            <p>Szia <strong>{keresztnev}</strong>!</p>
-            <p>Elkészült a <strong>{year}. {month_name}</strong> havi elszámolás.</p>
-            <table style="width:100%; border-collapse: collapse; margin: 16px 0;">
-              <tr style="background:#4a90d9; color:white;"><th style="padding:12px; text-align:left;">Megnevezés</th><th style="padding:12px; text-align:right;">Részlet</th></tr>
-              {own_row}{guest_row}
-              <tr style="background:#eaf4ff;"><td style="padding:12px;"><strong>📅 Összes részvétel</strong></td><td style="padding:12px; text-align:right;"><strong>{count} alkalom</strong></td></tr>
-              <tr style="background:#fff;"><td style="padding:14px; font-size:1.1em;">💰 <strong>Fizetendő összeg</strong></td><td style="padding:14px; font-size:1.3em; text-align:right; color:#e74c3c;"><strong>{amount:,.0f} Ft</strong></td></tr>
-            </table>
-            {"<p style='color:#888; font-size:0.9em;'>ℹ️ A fizetendő összeg tartalmazza a vendégeid terembérleti díját is.</p>" if has_guests else ""}
-            <p>Kérlek utald el a fenti összeget a szokásos számlaszámra! 🙏</p>
-            <hr style="border:none; border-top:1px solid #ddd; margin:20px 0;">
-            <p style="font-size:0.8em; color:#aaa; margin:0;">Ez egy automatikus üzenet — Röpi App Pro 🏐</p>
-          </div></body></html>"""
-        msg.attach(MIMEText(html_body, "html", "utf-8"))
-        server.send_message(msg)
         server.quit()
-        return True
-    except Exception as e:
-        st.warning(f"Email hiba ({to_address}): {e}")
-        return False
+    except Exception:
+        pass
+
+def build_personal_email(sender, to_address, name, month_name, year, count, amount, own_count=None, guest_names=None):
+    msg = MIMEMultipart("alternative")
+    msg["From"] = f"Röpi App 🏐 <{sender}>"
+    msg["To"] = to_address
+    msg["Subject"] = f"🏐 Röpi elszámolás — {year}. {month_name}"
+    keresztnev = name.split()[0]
+    has_guests = guest_names and guest_names != "—" and guest_names != ""
+    guest_row = f"""<tr style="background:#fff8e1;"><td style="padding:10px; color:#888;">🧑‍🤝‍🧑 Vendégek</td><td style="padding:10px; text-align:right; color:#888;">{guest_names}</td></tr>""" if has_guests else ""
+    own_row = f"""<tr style="background:#f9f9f9;"><td style="padding:10px; color:#555;">👤 Saját részvétel</td><td style="padding:10px; text-align:right; color:#555;">{own_count} alkalom</td></tr>""" if (own_count is not None and has_guests) else ""
+    html_body = f"""<html><body style="font-family: Arial, sans-serif; color: #333; max-width: 520px; margin: auto;">
+      <div style="background: #f8f8f8; border-radius: 12px; padding: 28px;">
+        <h2 style="color: #4a90d9; margin-top:0;">🏐 Havi Röpi Elszámolás</h2>
+        <p>Szia <strong>{keresztnev}</strong>!</p>
+        <p>Elkészült a <strong>{year}. {month_name}</strong> havi elszámolás.</p>
+        <table style="width:100%; border-collapse: collapse; margin: 16px 0;">
+          <tr style="background:#4a90d9; color:white;"><th style="padding:12px; text-align:left;">Megnevezés</th><th style="padding:12px; text-align:right;">Részlet</th></tr>
+          {own_row}{guest_row}
+          <tr style="background:#eaf4ff;"><td style="padding:12px;"><strong>📅 Összes részvétel</strong></td><td style="padding:12px; text-align:right;"><strong>{count} alkalom</strong></td></tr>
+          <tr style="background:#fff;"><td style="padding:14px; font-size:1.1em;">💰 <strong>Fizetendő összeg</strong></td><td style="padding:14px; font-size:1.3em; text-align:right; color:#e74c3c;"><strong>{amount:,.0f} Ft</strong></td></tr>
+        </table>
+        {"<p style='color:#888; font-size:0.9em;'>ℹ️ A fizetendő összeg tartalmazza a vendégeid terembérleti díját is.</p>" if has_guests else ""}
+        <p>Kérlek utald el a fenti összeget a szokásos számlaszámra! 🙏</p>
+        <hr style="border:none; border-top:1px solid #ddd; margin:20px 0;">
+        <p style="font-size:0.8em; color:#aaa; margin:0;">Ez egy automatikus üzenet — Röpi App Pro 🏐</p>
+      </div></body></html>"""
+    msg.attach(MIMEText(html_body, "html", "utf-8"))
+    return msg
+
+def _wait_for_rate_slot(limiter):
+    if limiter is None:
+        return
+    with limiter["lock"]:
+        now = time.monotonic()
+        wait = max(0.0, limiter["next_at"] - now)
+        limiter["next_at"] = max(now, limiter["next_at"]) + limiter["interval"]
+    if wait:
+        time.sleep(wait)
+
+def _deliver_email(conn, job, max_attempts, backoff=0.0, limiter=None):
+    error = ""
+    for attempt in range(max_attempts):
+        if attempt and backoff:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        _wait_for_rate_slot(limiter)
+        try:
+            if conn["server"] is None:
+                conn["server"], conn["sender"] = _get_smtp_connection(conn["settings"])
+            conn["server"].send_message(build_personal_email(conn["sender"], **job))
+            return ""
+        except smtplib.SMTPRecipientsRefused as e:
+            return f"Elutasított címzett: {e}"
+        except smtplib.SMTPAuthenticationError:
+            raise
+        except Exception as e:
+            error = str(e)
+            if conn["server"] is not None:
+                _close_smtp_connection(conn["server"])
+            conn["server"] = None
+    return error
+
+@st.cache_resource
+def _email_executor():
+    return ThreadPoolExecutor(max_workers=EMAIL_MAX_WORKERS, thread_name_prefix="email")
+
+def _email_worker(dispatch, job_queue, settings, limiter):
+    conn = {"server": None, "sender": None, "settings": settings}
+    try:
+        while True:
+            try:
+                job = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                error = _deliver_email(conn, job, EMAIL_MAX_ATTEMPTS, EMAIL_BACKOFF_SECONDS, limiter)
+            except smtplib.SMTPAuthenticationError as e:
+                _abort_email_dispatch(dispatch, job_queue, job, f"SMTP hitelesítési hiba: {e}")
+                return
+            with dispatch["lock"]:
+                if error:
+                    dispatch["dead_letters"].append({"job": job, "error": error})
+                else:
+                    dispatch["sent"].append(job["to_address"])
+    finally:
+        if conn["server"] is not None:
+            _close_smtp_connection(conn["server"])
+
+def _abort_email_dispatch(dispatch, job_queue, job, error):
+    jobs = [job]
+    while True:
+        try:
+            jobs.append(job_queue.get_nowait())
+        except queue.Empty:
+            break
+    with dispatch["lock"]:
+        dispatch["aborted"] = error
+        dispatch["dead_letters"] += [{"job": j, "error": error} for j in jobs]
+
+def start_email_dispatch(jobs, settings=None):
+    settings = settings or _smtp_settings()
+    job_queue = queue.Queue()
+    for job in jobs:
+        job_queue.put(job)
+    limiter = {"lock": threading.Lock(), "next_at": 0.0, "interval": 1.0 / max(settings["rate_per_second"], 0.01)}
+    dispatch = {"lock": threading.Lock(), "total": len(jobs), "sent": [], "dead_letters": [],
+                "aborted": None, "started_at": time.time(), "futures": []}
+    executor = _email_executor()
+    for _ in range(min(EMAIL_MAX_WORKERS, len(jobs))):
+        dispatch["futures"].append(executor.submit(_email_worker, dispatch, job_queue, settings, limiter))
+    return dispatch
+
+def email_dispatch_status(dispatch):
+    with dispatch["lock"]:
+        sent = len(dispatch["sent"])
+        dead_letters = list(dispatch["dead_letters"])
+    return {"total": dispatch["total"], "sent": sent, "failed": len(dead_letters), "dead_letters": dead_letters,
+            "aborted": dispatch["aborted"], "finished": all(f.done() for f in dispatch["futures"]),
+            "elapsed": time.time() - dispatch["started_at"]}
+
+def redrive_dead_letters(dispatch, settings=None):
+    with dispatch["lock"]:
+        jobs = [d["job"] for d in dispatch["dead_letters"]]
+    return start_email_dispatch(jobs, settings)
 
 def send_admin_summary_email(month_name, year, df_osszesito, pdf_bytes):
     try:
@@ -461,77 +1610,611 @@ def send_admin_summary_email(month_name, year, df_osszesito, pdf_bytes):
         st.error(f"Admin email hiba: {e}")
         return False
 
+@depends_on(FIRESTORE_MEMBERS)
 @st.cache_data(ttl=120)
+@marks_cache_miss
 def get_members_fs(_db):
     if _db is None:
         return pd.DataFrame(columns=["ID", "Név", "Email", "Aktív"])
     try:
-        docs = _db.collection(FIRESTORE_MEMBERS).order_by("name").stream()
-        data = []
-        for doc in docs:
-            d = doc.to_dict()
-            data.append([doc.id, d.get("name", ""), d.get("email", ""), d.get("active", True)])
-        return pd.DataFrame(data, columns=["ID", "Név", "Email", "Aktív"])
+        return FirestoreRepository(_db).list_members()
     except Exception as e:
         st.error(f"Hiba a tagok betöltésekor: {e}")
         return pd.DataFrame(columns=["ID", "Név", "Email", "Aktív"])
 
+@depends_on(FIRESTORE_MEMBERS)
+@st.cache_data(ttl=120)
+@marks_cache_miss
+def get_member_emails_fs(_db):
+    if _db is None:
+        replica = offline_replica(_db)
+        return replica.list_member_emails() if replica else []
+    try:
+        return FirestoreRepository(_db).list_member_emails()
+    except Exception:
+        return []
+
 def get_members_gs(gs_client):
     if gs_client is None:
         return pd.DataFrame(columns=["Név", "Email", "Aktív"])
     try:
-        ss = gs_client.open(GSHEET_NAME)
-        sheet_titles = [w.title for w in ss.worksheets()]
-        if MEMBERS_SHEET_NAME not in sheet_titles:
-            ws = ss.add_worksheet(title=MEMBERS_SHEET_NAME, rows=100, cols=5)
-            ws.append_row(["Név", "Email", "Aktív"])
-            return pd.DataFrame(columns=["Név", "Email", "Aktív"])
-        ws = ss.worksheet(MEMBERS_SHEET_NAME)
-        rows = ws.get_all_values()
+        rows = _members_worksheet(gs_client).get_all_values()
         if len(rows) < 2:
             return pd.DataFrame(columns=["Név", "Email", "Aktív"])
         return pd.DataFrame(rows[1:], columns=rows[0])
     except Exception as e:
+        reset_sheet_handles()
         st.error(f"Tagok betöltési hiba (Sheet): {e}")
         return pd.DataFrame(columns=["Név", "Email", "Aktív"])
 
-def sync_members_fs_to_gs(fs_db, gs_client):
-    df = get_members_fs(fs_db)
-    try:
-        ss = gs_client.open(GSHEET_NAME)
-        sheet_titles = [w.title for w in ss.worksheets()]
-        if MEMBERS_SHEET_NAME not in sheet_titles:
-            ws = ss.add_worksheet(title=MEMBERS_SHEET_NAME, rows=100, cols=5)
+def _member_sheet_row(member):
+    return [member["name"], member["email"], str(member["active"])]
+
+def _a1_column(n):
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+def _sheet_row_ranges(current, desired):
+    changed = [i for i, row in enumerate(desired) if i >= len(current) or (current[i] + [""] * len(row))[:len(row)] != row]
+    ranges = []
+    for i in changed:
+        if ranges and ranges[-1][1] == i - 1:
+            ranges[-1][1] = i
         else:
-            ws = ss.worksheet(MEMBERS_SHEET_NAME)
-        ws.clear()
-        rows = [["Név", "Email", "Aktív"]]
-        for _, row in df.iterrows():
-            rows.append([row["Név"], row["Email"], str(row["Aktív"])])
-        ws.append_rows(rows, value_input_option="USER_ENTERED")
-        return True, f"{len(df)} tag szinkronizálva a Sheet-be."
+            ranges.append([i, i])
+    return [{"range": f"A{start + 1}:{_a1_column(len(desired[start]))}{end + 1}", "values": desired[start:end + 1]}
+            for start, end in ranges]
+
+def sync_members_fs_to_gs(fs_db, gs_client, df=None):
+    if df is None:
+        df = get_members_fs(fs_db)
+    try:
+        ws = _members_worksheet(gs_client)
+        rows = ws.get_all_values()
+        body = [(row + ["", "", ""])[:3] for row in rows[1:]]
+        current = {i: member_doc(*row) for i, row in enumerate(body) if any(row)}
+        source = [member_doc(n, e, a) for n, e, a in zip(df["Név"], df["Email"], df["Aktív"])]
+        inserts, updates, deletes = diff_members(source, current)
+        for i, member in updates:
+            body[i] = _member_sheet_row(member)
+        deleted = set(deletes)
+        desired = [MEMBER_SHEET_HEADER] + [row for i, row in enumerate(body) if i in current and i not in deleted]
+        desired += [_member_sheet_row(member) for member in inserts]
+        desired += [["", "", ""]] * (len(rows) - len(desired))
+        ranges = _sheet_row_ranges(rows, desired)
+        if ranges:
+            ws.batch_update(ranges, value_input_option="USER_ENTERED")
+        return True, f"Tagok szinkronizálva a Sheet-be: {len(inserts)} új, {len(updates)} módosított, {len(deletes)} törölt."
     except Exception as e:
         return False, str(e)
 
-def sync_members_gs_to_fs(gs_client, fs_db):
+def _members_worksheet(gs_client):
+    return sheet_worksheet(gs_client, MEMBERS_SHEET_NAME, create_header=MEMBER_SHEET_HEADER)
+
+def _resync_members_sheet(fs_db, gs_client):
+    try:
+        df = FirestoreRepository(fs_db).list_members()
+    except Exception as e:
+        return False, f"a Sheet visszaállítása nem sikerült, szinkronizáld kézzel ({e})"
+    return sync_members_fs_to_gs(fs_db, gs_client, df=df)
+
+def add_member_both(fs_db, gs_client, name, email, active):
+    results = fan_out_writes({
+        "fs": lambda: fs_db.collection(FIRESTORE_MEMBERS).add({"name": name, "email": email, "active": active}),
+        "gs": lambda: _members_worksheet(gs_client).append_row([name, email, str(active)]),
+    })
+    if not results["fs"][0] and results["gs"][0]:
+        ok, msg = _resync_members_sheet(fs_db, gs_client)
+        results["gs"] = (False, "a Sheet sor visszavonva, mert a Firestore mentés nem sikerült" if ok else msg)
+    return results
+
+def members_after_committed_changes(df, results):
+    deleted_ids, updated, added = committed_changes(results)
+    out = df[~df["ID"].isin(deleted_ids)].copy()
+    field_map = {"name": "Név", "email": "Email", "active": "Aktív"}
+    for doc_id, fields in updated.items():
+        for key, value in fields.items():
+            if key in field_map:
+                out.loc[out["ID"] == doc_id, field_map[key]] = value
+    added_df = pd.DataFrame([[doc_id, d.get("name", ""), d.get("email", ""), d.get("active", True)]
+                             for doc_id, d in added.items()], columns=["ID", "Név", "Email", "Aktív"])
+    if not added_df.empty:
+        out = pd.concat([out, added_df], ignore_index=True)
+    return out.sort_values("Név", kind="stable").reset_index(drop=True)
+
+def members_editor_ops(fs_db, df, changes, new_ids):
+    field_map = {"Név": "name", "Email": "email", "Aktív": "active"}
+    return editor_change_ops(
+        fs_db, FIRESTORE_MEMBERS, df, changes, new_ids=new_ids,
+        to_update=lambda edits: {field_map[k]: v for k, v in edits.items() if k in field_map},
+        to_new=lambda new_row: {"name": new_row.get("Név", ""), "email": new_row.get("Email", ""),
+                                "active": new_row.get("Aktív", True)})
+
+def save_members_editor_changes(fs_db, gs_client, df, changes, new_ids):
+    ops = members_editor_ops(fs_db, df, changes, new_ids)
+    expected = members_after_committed_changes(df, [{"ops": ops, "ok": True}])
+    results = fan_out_writes({
+        "fs": lambda: apply_change_set_fs(fs_db, ops),
+        "gs": lambda: sync_members_fs_to_gs(fs_db, gs_client, df=expected),
+    })
+    fs_ok, fs_result = results["fs"]
+    if not fs_ok:
+        fs_result = [{"batch": 1, "ops": ops, "ok": False, "error": str(fs_result)}]
+    sheet = results["gs"][1] if results["gs"][0] else (False, str(results["gs"][1]))
+    if not all(r["ok"] for r in fs_result):
+        sheet = sync_members_fs_to_gs(fs_db, gs_client, df=members_after_committed_changes(df, fs_result))
+    return fs_result, sheet
+
+def sheet_rows_to_attendance_docs(rows):
+    docs = []
+    for r in rows[1:]:
+        name = r[0] if len(r) > 0 else ""
+        if not name:
+            continue
+        docs.append(stamp_updated(canonical_attendance_fields({
+            "name": name, "status": r[1] if len(r) > 1 else "Yes",
+            "timestamp": r[2] if len(r) > 2 else "",
+            "event_date": r[3] if len(r) > 3 else "", "mode": "valós"
+        })))
+    return docs
+
+def sheet_rows_to_invoice_docs(rows):
+    docs = []
+    for r in rows[1:]:
+        if not r or not r[0]:
+            continue
+        inv_date = parse_date_str(r[0])
+        if not inv_date:
+            continue
+        try:
+            amount = float(str(r[1]).replace(' ', '').replace('Ft', '').replace('HUF', '').replace('\xa0', ''))
+        except Exception:
+            continue
+        t_month = 12 if inv_date.month == 1 else inv_date.month - 1
+        t_year = inv_date.year - 1 if inv_date.month == 1 else inv_date.year
+        docs.append({
+            "inv_date": inv_date.strftime("%Y-%m-%d"), "target_year": t_year,
+            "target_month": t_month, "amount": amount,
+            "filename": r[2] if len(r) > 2 else ""
+        })
+    return docs
+
+def member_doc(name, email, active):
+    return {"name": str(name).strip(), "email": str(email).strip(),
+            "active": str(active).lower() not in ("false", "0", "nem")}
+
+def sheet_df_to_member_docs(df):
+    docs = []
+    for _, row in df.iterrows():
+        doc = member_doc(row.get("Név", ""), row.get("Email", ""), row.get("Aktív", "True"))
+        if doc["name"]:
+            docs.append(doc)
+    return docs
+
+def _member_match_keys(member):
+    keys = []
+    if member["email"]:
+        keys.append(("email", member["email"].casefold()))
+    if member["name"]:
+        keys.append(("name", member["name"].casefold()))
+    return keys
+
+def diff_members(source, target):
+    index = {}
+    for key, member in target.items():
+        for match_key in _member_match_keys(member):
+            index.setdefault(match_key, key)
+    matched, inserts, updates = set(), [], []
+    for member in source:
+        key = next((index[k] for k in _member_match_keys(member) if k in index and index[k] not in matched), None)
+        if key is None:
+            inserts.append(member)
+            continue
+        matched.add(key)
+        if target[key] != member:
+            updates.append((key, member))
+    return inserts, updates, [key for key in target if key not in matched]
+
+def bulk_replace_collection_fs(db, collection_name, docs, on_progress=None, id_field=None):
+    col = db.collection(collection_name)
+    ops = [("delete", doc_ref, None) for doc_ref in col.list_documents()]
+    ops += [("set", col.document(str(data[id_field]) if id_field else None), data) for data in docs]
+    return len(docs), commit_ops_with_progress(db, ops, on_progress)
+
+def commit_ops_with_progress(db, ops, on_progress=None):
+    started = time.perf_counter()
+    done = 0
+    for chunk in _chunked(ops, FIRESTORE_BATCH_LIMIT):
+        commit_firestore_ops(db, chunk)
+        done += len(chunk)
+        if on_progress:
+            on_progress(done, len(ops))
+    return time.perf_counter() - started
+
+def _format_throughput(count, elapsed):
+    rate = count / elapsed if elapsed > 0 else float(count)
+    return f"{elapsed:.1f} mp, {rate:.0f} sor/mp"
+
+def _sync_progress_callback(label):
+    bar = st.progress(0.0, text=label)
+    def update(done, total):
+        bar.progress(done / total if total else 1.0, text=f"{label} ({done}/{total} művelet)")
+    return update
+
+def sync_members_gs_to_fs(gs_client, fs_db, on_progress=None):
     df = get_members_gs(gs_client)
     try:
-        docs = fs_db.collection(FIRESTORE_MEMBERS).stream()
-        for doc in docs:
-            doc.reference.delete()
-        count = 0
-        for _, row in df.iterrows():
-            name = str(row.get("Név", "")).strip()
-            email = str(row.get("Email", "")).strip()
-            if not name:
-                continue
-            active = str(row.get("Aktív", "True")).lower() not in ("false", "0", "nem")
-            fs_db.collection(FIRESTORE_MEMBERS).add({"name": name, "email": email, "active": active})
-            count += 1
-        return True, f"{count} tag szinkronizálva a Firestore-ba."
+        col = fs_db.collection(FIRESTORE_MEMBERS)
+        current = {}
+        for doc in col.select(MEMBER_FIELDS).stream():
+            d = doc.to_dict()
+            current[doc.id] = member_doc(d.get("name", ""), d.get("email", ""), d.get("active", True))
+        inserts, updates, deletes = diff_members(sheet_df_to_member_docs(df), current)
+        ops = [("set", col.document(), member) for member in inserts]
+        ops += [("update", col.document(doc_id), member) for doc_id, member in updates]
+        ops += [("delete", col.document(doc_id), None) for doc_id in deletes]
+        elapsed = commit_ops_with_progress(fs_db, ops, on_progress)
+        return True, (f"Tagok szinkronizálva a Firestore-ba: {len(inserts)} új, {len(updates)} módosított, "
+                      f"{len(deletes)} törölt. ({_format_throughput(len(ops), elapsed)})")
     except Exception as e:
         return False, str(e)
 
+# ─────────────────────────────────────────────
+# ADATTÁRAK (REPOSITORY)
+# ─────────────────────────────────────────────
+
+def _invoice_with_month_name(d):
+    if "month_name" not in d and "target_month" in d:
+        d["month_name"] = MONTH_NAMES_HU[int(d["target_month"]) - 1]
+    return d
+
+def _sort_invoices(invoices):
+    invoices.sort(key=lambda x: (int(x.get('target_year', 0)), int(x.get('target_month', 0))), reverse=True)
+    return invoices
+
+def _filter_attendance_window(df, start_date, end_date):
+    if df.empty or (start_date is None and end_date is None):
+        return df
+    dates = pd.Series([record_session_date(e, t) for e, t in zip(df["Alkalom Dátuma"], df["Regisztráció Időpontja"])],
+                      index=df.index, dtype=object)
+    keep = dates.notna()
+    if start_date is not None:
+        keep &= dates.map(lambda d: d is not None and d >= start_date)
+    if end_date is not None:
+        keep &= dates.map(lambda d: d is not None and d <= end_date)
+    return df[keep]
+
+class Repository(abc.ABC):
+    name = "repository"
+
+    @abc.abstractmethod
+    def list_attendance(self, start_date=None, end_date=None):
+        ...
+
+    @abc.abstractmethod
+    def list_invoices(self):
+        ...
+
+    @abc.abstractmethod
+    def list_cancelled_sessions(self):
+        ...
+
+    @abc.abstractmethod
+    def list_members(self):
+        ...
+
+    def list_member_emails(self):
+        return self.list_members()["Email"].tolist()
+
+class FirestoreRepository(Repository):
+    name = "Firestore"
+
+    def __init__(self, db):
+        self.db = db
+
+    def list_attendance(self, start_date=None, end_date=None):
+        if start_date is None and end_date is None:
+            return _attendance_docs_to_df(self.db.collection(FIRESTORE_COLLECTION).select(ATTENDANCE_FIELDS).stream())
+        docs = _stream_attendance_window_fs(self.db, start_date or datetime(1900, 1, 1).date(),
+                                            end_date or datetime(9999, 12, 31).date())
+        return _filter_attendance_window(_attendance_docs_to_df(docs), start_date, end_date)
+
+    def list_invoices(self):
+        invoices = []
+        for doc in self.db.collection(FIRESTORE_INVOICES).select(INVOICE_FIELDS).stream():
+            d = doc.to_dict()
+            d["ID"] = doc.id
+            invoices.append(_invoice_with_month_name(d))
+        return _sort_invoices(invoices)
+
+    def list_cancelled_sessions(self):
+        cancelled = set()
+        for doc in self.db.collection(FIRESTORE_CANCELLED).select(["date"]).stream():
+            date_obj = parse_date_str(doc.to_dict().get("date"))
+            if date_obj:
+                cancelled.add(date_obj)
+        return cancelled
+
+    def list_members(self):
+        data = []
+        for doc in self.db.collection(FIRESTORE_MEMBERS).select(MEMBER_FIELDS).order_by("name").stream():
+            d = doc.to_dict()
+            data.append([doc.id, d.get("name", ""), d.get("email", ""), d.get("active", True)])
+        return pd.DataFrame(data, columns=["ID", "Név", "Email", "Aktív"])
+
+    def list_member_emails(self):
+        return [doc.to_dict().get("email", "") for doc in self.db.collection(FIRESTORE_MEMBERS).select(["email"]).stream()]
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id TEXT PRIMARY KEY, name TEXT, status TEXT, timestamp TEXT,
+    event_date TEXT, session_date TEXT, mode TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_event_date ON attendance(event_date);
+CREATE INDEX IF NOT EXISTS idx_attendance_session_date ON attendance(session_date);
+CREATE INDEX IF NOT EXISTS idx_attendance_name ON attendance(name);
+CREATE TABLE IF NOT EXISTS invoices (
+    id TEXT PRIMARY KEY, inv_date TEXT, target_year INTEGER, target_month INTEGER,
+    amount REAL, filename TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_target ON invoices(target_year, target_month);
+CREATE TABLE IF NOT EXISTS cancelled_sessions (id TEXT PRIMARY KEY, date TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_cancelled_date ON cancelled_sessions(date);
+CREATE TABLE IF NOT EXISTS members (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL, email TEXT, active INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_members_name ON members(name);
+CREATE INDEX IF NOT EXISTS idx_members_email ON members(email);
+"""
+
+class SqliteRepository(Repository):
+    name = "SQLite"
+
+    def __init__(self, path=SQLITE_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SQLITE_SCHEMA)
+
+    def list_attendance(self, start_date=None, end_date=None):
+        sql = "SELECT id, name, status, timestamp, event_date, mode FROM attendance"
+        where, params = [], []
+        if start_date is not None:
+            where.append("session_date >= ?")
+            params.append(start_date.isoformat())
+        if end_date is not None:
+            where.append("session_date <= ?")
+            params.append(end_date.isoformat())
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self.lock:
+            rows = self.conn.execute(sql + " ORDER BY timestamp DESC", params).fetchall()
+        return pd.DataFrame(rows, columns=ATTENDANCE_FS_COLUMNS)
+
+    def list_invoices(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, inv_date, target_year, target_month, amount, filename FROM invoices").fetchall()
+        invoices = [_invoice_with_month_name({"ID": r[0], "inv_date": r[1], "target_year": r[2],
+                                              "target_month": r[3], "amount": r[4], "filename": r[5]})
+                    for r in rows]
+        return _sort_invoices(invoices)
+
+    def list_cancelled_sessions(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT date FROM cancelled_sessions").fetchall()
+        return {d for d in (parse_date_str(r[0]) for r in rows) if d}
+
+    def has_data(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM attendance LIMIT 1").fetchone() is not None
+
+    def list_members(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT id, name, email, active FROM members ORDER BY name").fetchall()
+        return pd.DataFrame([(i, n, e, bool(a)) for i, n, e, a in rows], columns=["ID", "Név", "Email", "Aktív"])
+
+    def replace_all(self, attendance_df, invoices, cancelled_dates, members_df):
+        attendance_rows = []
+        for doc_id, name, status, timestamp, event_date, mode in attendance_df[ATTENDANCE_FS_COLUMNS].itertuples(index=False):
+            session_date = record_session_date(event_date, timestamp)
+            attendance_rows.append((doc_id, name, status, timestamp, event_date,
+                                    session_date.isoformat() if session_date else None, mode))
+        invoice_rows = [(inv.get("ID") or uuid.uuid4().hex, inv.get("inv_date"), int(inv.get("target_year", 0)),
+                         int(inv.get("target_month", 0)), float(inv.get("amount", 0)), inv.get("filename", ""))
+                        for inv in invoices]
+        cancelled_rows = [(uuid.uuid4().hex, d.strftime("%Y-%m-%d")) for d in sorted(cancelled_dates)]
+        member_rows = [(doc_id, name, email, int(bool(active)))
+                       for doc_id, name, email, active in members_df[["ID", "Név", "Email", "Aktív"]].itertuples(index=False)]
+        with self.lock, self.conn:
+            for table in ("attendance", "invoices", "cancelled_sessions", "members"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.executemany("INSERT INTO attendance VALUES (?, ?, ?, ?, ?, ?, ?)", attendance_rows)
+            self.conn.executemany("INSERT INTO invoices VALUES (?, ?, ?, ?, ?, ?)", invoice_rows)
+            self.conn.executemany("INSERT INTO cancelled_sessions VALUES (?, ?)", cancelled_rows)
+            self.conn.executemany("INSERT INTO members VALUES (?, ?, ?, ?)", member_rows)
+        return len(attendance_rows)
+
+@st.cache_resource
+def get_sqlite_repository(path=SQLITE_DB_FILE):
+    return SqliteRepository(path)
+
+def offline_replica(fs_db):
+    if fs_db is not None or not os.path.exists(SQLITE_DB_FILE):
+        return None
+    replica = get_sqlite_repository()
+    return replica if replica.has_data() else None
+
+def refresh_sqlite_replica(source, replica=None):
+    replica = replica or get_sqlite_repository()
+    started = time.perf_counter()
+    count = replica.replace_all(source.list_attendance(), source.list_invoices(),
+                                source.list_cancelled_sessions(), source.list_members())
+    return count, time.perf_counter() - started
+
+# ─────────────────────────────────────────────
+# PARQUET PILLANATKÉP
+# ─────────────────────────────────────────────
+
+_DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+PARQUET_SCHEMAS = {
+    FIRESTORE_COLLECTION: pa.schema([("id", pa.string()), ("name", _DICT_STRING), ("status", _DICT_STRING),
+                                     ("timestamp", pa.timestamp("s")), ("event_date", pa.date32()),
+                                     ("session_date", pa.date32()), ("mode", _DICT_STRING)]),
+    FIRESTORE_INVOICES: pa.schema([("id", pa.string()), ("inv_date", pa.date32()), ("amount", pa.float64()),
+                                   ("month_name", _DICT_STRING), ("filename", pa.string())]),
+    FIRESTORE_CANCELLED: pa.schema([("id", pa.string()), ("date", pa.date32())]),
+    FIRESTORE_MEMBERS: pa.schema([("id", pa.string()), ("name", pa.string()), ("email", pa.string()),
+                                  ("active", pa.bool_())]),
+}
+
+def _month_partition(date_obj):
+    return (date_obj.year, date_obj.month) if date_obj else (0, 0)
+
+def _partition_name(key):
+    return f"{key[0]:04d}-{key[1]:02d}"
+
+def _partition_path(root, key):
+    if key is None:
+        return os.path.join(root, "data.parquet")
+    return os.path.join(root, f"year={key[0]}", f"month={key[1]}", "data.parquet")
+
+def _parquet_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _attendance_parquet_rows(docs):
+    for doc in docs:
+        d = doc.to_dict()
+        session_date = record_session_date(d.get("event_date"), d.get("timestamp"))
+        yield _month_partition(session_date), {
+            "id": doc.id, "name": d.get("name"), "status": d.get("status"), "timestamp": parse_timestamp_str(d.get("timestamp")),
+            "event_date": parse_date_str(d.get("event_date")), "session_date": session_date,
+            "mode": d.get("mode", "ismeretlen"),
+        }
+
+def _invoice_parquet_rows(docs):
+    for doc in docs:
+        d = doc.to_dict()
+        try:
+            key = (int(d.get("target_year")), int(d.get("target_month")))
+        except (TypeError, ValueError):
+            key = (0, 0)
+        yield key, {"id": doc.id, "inv_date": parse_date_str(d.get("inv_date")), "amount": _parquet_number(d.get("amount")),
+                    "month_name": d.get("month_name") or (MONTH_NAMES_HU[key[1] - 1] if key[1] else None),
+                    "filename": d.get("filename")}
+
+def _cancelled_parquet_rows(docs):
+    for doc in docs:
+        date_obj = parse_date_str(doc.to_dict().get("date"))
+        yield _month_partition(date_obj), {"id": doc.id, "date": date_obj}
+
+def _member_parquet_rows(docs):
+    for doc in docs:
+        d = doc.to_dict()
+        yield None, {"id": doc.id, "name": d.get("name"), "email": d.get("email"),
+                     "active": str(d.get("active", True)).lower() not in ("false", "0", "nem")}
+
+def _parquet_table(rows, schema):
+    arrays = []
+    for field in schema:
+        values = [r.get(field.name) for r in rows]
+        if pa.types.is_dictionary(field.type) or pa.types.is_string(field.type):
+            array = pa.array([None if v is None else str(v) for v in values], pa.string())
+            arrays.append(array.dictionary_encode() if pa.types.is_dictionary(field.type) else array)
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def _write_parquet_partitions(root, schema, rows, batch_rows=PARQUET_BATCH_ROWS):
+    writers, buffers, counts = {}, {}, {}
+    def flush(key):
+        batch = buffers.pop(key, [])
+        if key not in writers:
+            tmp_path = os.path.join(os.path.dirname(_partition_path(root, key)), ".data.parquet.tmp")
+            os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+            writers[key] = (pq.ParquetWriter(tmp_path, schema, compression="zstd"), tmp_path)
+        writers[key][0].write_table(_parquet_table(batch, schema))
+        counts[key] = counts.get(key, 0) + len(batch)
+    try:
+        for key, row in rows:
+            buffers.setdefault(key, []).append(row)
+            if len(buffers[key]) >= batch_rows:
+                flush(key)
+        for key in list(buffers):
+            flush(key)
+    except BaseException:
+        for writer, tmp_path in writers.values():
+            writer.close()
+            os.remove(tmp_path)
+        raise
+    for key, (writer, tmp_path) in writers.items():
+        writer.close()
+        os.replace(tmp_path, _partition_path(root, key))
+    return counts
+
+def _read_parquet_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, PARQUET_MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_parquet_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, PARQUET_MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def _export_parquet_collection(out_dir, manifest, collection_name, rows, since=None):
+    root = os.path.join(out_dir, collection_name)
+    counts = _write_parquet_partitions(root, PARQUET_SCHEMAS[collection_name], rows)
+    written = {_partition_name(k) if k else "": n for k, n in counts.items()}
+    previous = manifest.get(collection_name, {}).get("partitions", {})
+    for name in previous:
+        if name and name not in written and (since is None or name >= since):
+            shutil.rmtree(os.path.join(root, f"year={int(name[:4])}", f"month={int(name[5:])}"), ignore_errors=True)
+    partitions = {k: v for k, v in previous.items() if since is not None and k and k < since}
+    partitions.update(written)
+    manifest[collection_name] = {"partitions": partitions,
+                                 "exported_at": datetime.now(HUNGARY_TZ).strftime("%Y-%m-%d %H:%M:%S")}
+    return sum(counts.values())
+
+def export_parquet_snapshot(db, out_dir=PARQUET_EXPORT_DIR, full=False):
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _read_parquet_manifest(out_dir)
+    exported = sorted(k for k in manifest.get(FIRESTORE_COLLECTION, {}).get("partitions", {}) if k > "0000-00")
+    since = None if full or not exported else exported[-1]
+    if since is None:
+        docs = db.collection(FIRESTORE_COLLECTION).select(ATTENDANCE_FIELDS).stream()
+    else:
+        docs = _stream_attendance_window_fs(db, datetime.strptime(since, "%Y-%m").date(), datetime.max.date())
+    rows = ((key, row) for key, row in _attendance_parquet_rows(docs) if since is None or _partition_name(key) >= since)
+    counts = {FIRESTORE_COLLECTION: _export_parquet_collection(out_dir, manifest, FIRESTORE_COLLECTION, rows, since)}
+    for collection_name, fields, to_rows in ((FIRESTORE_INVOICES, INVOICE_FIELDS, _invoice_parquet_rows),
+                                             (FIRESTORE_CANCELLED, ["date"], _cancelled_parquet_rows),
+                                             (FIRESTORE_MEMBERS, MEMBER_FIELDS, _member_parquet_rows)):
+        docs = db.collection(collection_name).select(fields).stream()
+        counts[collection_name] = _export_parquet_collection(out_dir, manifest, collection_name, to_rows(docs))
+    _write_parquet_manifest(out_dir, manifest)
+    return counts, time.perf_counter() - started
+
+def parquet_snapshot_zip(out_dir=PARQUET_EXPORT_DIR):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for root, _, files in os.walk(out_dir):
+            for name in sorted(files):
+                if not name.endswith(".tmp"):
+                    path = os.path.join(root, name)
+                    zf.write(path, os.path.relpath(path, out_dir))
+    return buffer.getvalue()
+
 # ─────────────────────────────────────────────
 # UI FÜGGVÉNYEK
 # ─────────────────────────────────────────────
@@ -539,7 +2222,10 @@ def sync_members_gs_to_fs(gs_client, fs_db):
 def render_admin_page(gs_client, fs_client):
     st.title("🛠️ Admin Regisztráció")
     st.success("🟢 Aktív: Jelenlét rögzítése üzemmód.")
-    rows = get_attendance_rows_gs(gs_client)
+    flash = st.session_state.pop("admin_flash", None)
+    if flash:
+        getattr(st, flash[0])(flash[1])
+    render_attendance_outbox_status(gs_client, fs_client)
 
     if st.session_state.admin_step == 1:
         dt = generate_tuesday_dates()
@@ -570,10 +2256,11 @@ def render_admin_page(gs_client, fs_client):
         st.info(f"Kiválasztott dátum: {st.session_state.admin_date}")
         if not pg:
             st.success("Nincsenek rögzítendő vendégek. Készen állsz a mentésre!")
+        guest_index = get_guest_index_gs(gs_client) if pg else {}
         for n, c in pg:
             with st.container(border=True):
                 st.subheader(f"**{n}** vendégei:")
-                history = get_historical_guests_list(rows, n)
+                history = guest_index.get(n, [])
                 options = ["-- Új név írása --"] + history
                 for i in range(c):
                     sel = st.selectbox(f"{i+1}. vendég ({n}):", options, key=f"admin_sel_{n}_{i}")
@@ -615,16 +2302,9 @@ def render_admin_page(gs_client, fs_client):
                             if g_name:
                                 rows_to_add.append([f"{name} - {g_name}", "Yes", ts, target_date, "", "valós"])
                 success, msg = save_all_data(gs_client, fs_client, rows_to_add)
-                if success:
-                    st.success(msg)
-                    reset_admin_form()
-                    time.sleep(3)
-                    st.rerun()
-                else:
-                    st.warning(msg)
-                    time.sleep(4)
-                    reset_admin_form()
-                    st.rerun()
+                st.session_state.admin_flash = ("success" if success else "warning", msg)
+                reset_admin_form()
+                st.rerun()
             except Exception as e:
                 st.error(f"Hiba: {e}")
         if st.button("⬅️ Vissza a szerkesztéshez"):
@@ -639,29 +2319,11 @@ def render_attendance_overview_page(fs_db):
     if selected_date_str:
         selected_date = parse_date_str(selected_date_str)
         with st.spinner("Adatok betöltése a Firestore-ból..."):
-            df_fs = get_attendance_rows_fs(fs_db)
-        if df_fs.empty:
+            summaries = get_session_summaries_fs(fs_db, (selected_date,))
+        if summaries is None:
             st.warning("Nem sikerült betölteni a Firestore adatokat.")
             return
-        yes_set = set()
-        no_set = set()
-        for _, row in df_fs.iterrows():
-            name = str(row["Név"]).strip() if pd.notna(row["Név"]) else ""
-            is_coming = str(row["Jön-e"]).strip() if pd.notna(row["Jön-e"]) else ""
-            if not name:
-                continue
-            mode_val = str(row["Mód"]).strip().lower() if pd.notna(row["Mód"]) else "valós"
-            if mode_val == "teszt":
-                continue
-            reg_val = str(row["Regisztráció Időpontja"]) if pd.notna(row["Regisztráció Időpontja"]) else ""
-            evt_val = str(row["Alkalom Dátuma"]) if pd.notna(row["Alkalom Dátuma"]) else ""
-            rel_date = parse_date_str(evt_val) or parse_date_str(reg_val)
-            if rel_date == selected_date:
-                if is_coming == "Yes":
-                    yes_set.add(name)
-                elif is_coming == "No":
-                    no_set.add(name)
-        final_attendees = sorted(list(yes_set - no_set))
+        final_attendees = sorted(summaries.get(selected_date, []))
         count = len(final_attendees)
         st.markdown("---")
         col1, col2 = st.columns([1, 2])
@@ -676,6 +2338,71 @@ def render_attendance_overview_page(fs_db):
             else:
                 st.info("Erre az alkalomra nincs érvényes regisztráció.")
 
+def change_set_summary(results):
+    return f"{sum(len(r['ops']) for r in results)} művelet, {len(results)} kötegben"
+
+def render_change_set_results(results):
+    if all(r["ok"] for r in results):
+        return True
+    st.error("Néhány köteg mentése nem sikerült, a sikeres kötegek változásai érvényesültek:")
+    st.dataframe(pd.DataFrame([{"Köteg": r["batch"], "Műveletek": len(r["ops"]), "Sikeres": "✅" if r["ok"] else "❌",
+                                "Hiba": r["error"]} for r in results]), use_container_width=True, hide_index=True)
+    return False
+
+def _attendance_browser_filters():
+    c1, c2, c3 = st.columns([2, 1, 1])
+    sort_label = c1.selectbox("Rendezés alapja:", list(ATTENDANCE_SORT_FIELDS), key="db_sort_col")
+    descending = not c2.checkbox("Növekvő sorrend", value=False, key="db_asc")
+    page_size = c3.selectbox("Sor / oldal:", DB_PAGE_SIZES, index=1, key="db_page_size")
+    f1, f2, f3 = st.columns([2, 1, 2])
+    name = f1.text_input("Név (pontos egyezés):", key="db_filter_name").strip()
+    mode = f2.selectbox("Mód:", ["Mind"] + ATTENDANCE_MODES, key="db_filter_mode")
+    date_range = None
+    if f3.checkbox("Szűrés alkalom dátumára", key="db_filter_date_on"):
+        picked = f3.date_input("Időszak:", value=(datetime.now(HUNGARY_TZ).date() - timedelta(days=90),
+                                                   datetime.now(HUNGARY_TZ).date()), key="db_filter_dates")
+        if isinstance(picked, (list, tuple)) and len(picked) == 2:
+            date_range = tuple(picked)
+    if date_range:
+        st.caption("Dátumszűrésnél a lista az alkalom dátuma szerint rendeződik.")
+    return {"sort_field": ATTENDANCE_SORT_FIELDS[sort_label], "descending": descending, "page_size": page_size,
+            "name": name or None, "mode": None if mode == "Mind" else mode, "date_range": date_range}
+
+def render_attendance_browser(fs_db):
+    if fs_db is None:
+        st.warning("Nincs aktív Firestore kapcsolat.")
+        return None, None
+    filters = _attendance_browser_filters()
+    from_snapshot = not attendance_paging_ready(fs_db)
+    signature = (from_snapshot,) + tuple(sorted((k, str(v)) for k, v in filters.items()))
+    if st.session_state.get("db_page_signature") != signature:
+        st.session_state.db_page_signature = signature
+        st.session_state.db_page_stack = [0 if from_snapshot else None]
+        st.session_state.db_page_token = st.session_state.get("db_page_token", 0) + 1
+    stack = st.session_state.db_page_stack
+    query_filters = {k: filters[k] for k in ("sort_field", "descending", "name", "mode", "date_range")}
+    try:
+        if from_snapshot:
+            df_fs, next_cursor, has_more = fetch_snapshot_attendance_page(
+                get_attendance_rows_fs(fs_db), offset=stack[-1], page_size=filters["page_size"], **query_filters)
+        else:
+            df_fs, next_cursor, has_more = fetch_attendance_page(attendance_page_query(fs_db, **query_filters),
+                                                                 stack[-1], filters["page_size"])
+    except Exception as e:
+        st.error(f"Hiba a Firestore lekérdezésekor (lehet, hogy összetett index szükséges): {e}")
+        return None, None
+    p1, p2, p3 = st.columns([1, 2, 1])
+    if p1.button("⬅️ Előző", disabled=len(stack) == 1, use_container_width=True, key="db_page_prev"):
+        stack.pop()
+        st.session_state.db_page_token += 1
+        st.rerun()
+    p2.caption(f"{len(stack)}. oldal · {len(df_fs)} sor")
+    if p3.button("Következő ➡️", disabled=not has_more, use_container_width=True, key="db_page_next"):
+        stack.append(next_cursor)
+        st.session_state.db_page_token += 1
+        st.rerun()
+    return df_fs, f"db_fs_editor_{st.session_state.db_page_token}"
+
 def render_database_page(gs_client, fs_db, logged_in=False):
     st.title("🗂️ Adatbázis")
 
@@ -707,6 +2434,9 @@ def render_database_page(gs_client, fs_db, logged_in=False):
         st.subheader("Firestore Adatbázis")
 
         if logged_in:
+            if fs_db is not None and pending_migrations(fs_db):
+                st.info("ℹ️ Vannak le nem futott adatbázis-migrációk, addig a lekérdezések a teljes gyűjteményt olvassák. "
+                        "A Szinkronizálás panelen futtathatók.")
             st.markdown("---")
             with st.expander("🔄 Adatok Szinkronizálása (Sheet ↔ Firestore)"):
                 st.warning("⚠️ A szinkronizálás felülírja a céladatbázist!")
@@ -719,29 +2449,22 @@ def render_database_page(gs_client, fs_db, logged_in=False):
                             if sync_source == "Google Sheets":
                                 gs_rows = get_attendance_rows_gs(gs_client)
                                 if len(gs_rows) > 1:
-                                    for doc in fs_db.collection(FIRESTORE_COLLECTION).stream():
-                                        doc.reference.delete()
-                                    count = 0
-                                    for r in gs_rows[1:]:
-                                        try:
-                                            name = r[0] if len(r) > 0 else ""
-                                            if not name: continue
-                                            fs_db.collection(FIRESTORE_COLLECTION).add({
-                                                "name": name, "status": r[1] if len(r) > 1 else "Yes",
-                                                "timestamp": r[2] if len(r) > 2 else "",
-                                                "event_date": r[3] if len(r) > 3 else "", "mode": "valós"
-                                            })
-                                            count += 1
-                                        except Exception:
-                                            pass
-                                    st.success(f"Kész! {count} adat átmásolva a Firestore-ba.")
+                                    try:
+                                        count, elapsed = bulk_replace_collection_fs(
+                                            fs_db, FIRESTORE_COLLECTION, sheet_rows_to_attendance_docs(gs_rows),
+                                            on_progress=_sync_progress_callback("Jelenlét szinkronizálása..."))
+                                        st.success(f"Kész! {count} adat átmásolva a Firestore-ba. ({_format_throughput(count, elapsed)})")
+                                        rebuild_session_summaries_fs(fs_db)
+                                    except Exception as e:
+                                        st.error(f"Hiba: {e}")
+                                    reset_attendance_cache()
                                 else:
                                     st.info("Nincs másolható adat a Sheet-ben.")
                             else:
                                 df_fs_sync = get_attendance_rows_fs(fs_db)
                                 if not df_fs_sync.empty:
                                     try:
-                                        sheet = gs_client.open(GSHEET_NAME).sheet1
+                                        sheet = sheet_worksheet(gs_client)
                                         sheet.clear()
                                         new_rows = [["Név", "Jön-e", "Regisztráció Időpontja", "Alkalom Dátuma", "Üres", "Mód"]]
                                         for _, row in df_fs_sync.iterrows():
@@ -750,39 +2473,21 @@ def render_database_page(gs_client, fs_db, logged_in=False):
                                         st.success(f"Kész! {len(new_rows)-1} adat átmásolva a Sheet-be.")
                                     except Exception as e:
                                         st.error(f"Hiba: {e}")
-                            st.cache_data.clear()
+                            invalidate_caches(GSHEET_NAME, FIRESTORE_COLLECTION)
                             time.sleep(2)
                             st.rerun()
                 with col_m2:
                     if st.button("🧾 Számlák szinkronizálása", type="primary", use_container_width=True):
                         with st.spinner("Folyamatban..."):
                             try:
-                                ss = gs_client.open(GSHEET_NAME)
-                                ws_titles = [w.title for w in ss.worksheets()]
-                                szamlak_sheet = ss.worksheet("Szamlak") if "Szamlak" in ws_titles else ss.worksheet("szamlak")
+                                szamlak_sheet = sheet_worksheet(gs_client, "Szamlak")
                                 if sync_source == "Google Sheets":
                                     rows_sz = szamlak_sheet.get_all_values()
                                     if len(rows_sz) > 1:
-                                        for doc in fs_db.collection(FIRESTORE_INVOICES).stream():
-                                            doc.reference.delete()
-                                        count = 0
-                                        for r in rows_sz[1:]:
-                                            if not r[0]: continue
-                                            inv_date = parse_date_str(r[0])
-                                            if not inv_date: continue
-                                            try:
-                                                amount = float(str(r[1]).replace(' ', '').replace('Ft', '').replace('HUF', '').replace('\xa0', ''))
-                                            except Exception:
-                                                continue
-                                            t_month = 12 if inv_date.month == 1 else inv_date.month - 1
-                                            t_year = inv_date.year - 1 if inv_date.month == 1 else inv_date.year
-                                            fs_db.collection(FIRESTORE_INVOICES).add({
-                                                "inv_date": inv_date.strftime("%Y-%m-%d"), "target_year": t_year,
-                                                "target_month": t_month, "amount": amount,
-                                                "filename": r[2] if len(r) > 2 else ""
-                                            })
-                                            count += 1
-                                        st.success(f"Kész! {count} számla átmásolva.")
+                                        count, elapsed = bulk_replace_collection_fs(
+                                            fs_db, FIRESTORE_INVOICES, sheet_rows_to_invoice_docs(rows_sz),
+                                            on_progress=_sync_progress_callback("Számlák szinkronizálása..."))
+                                        st.success(f"Kész! {count} számla átmásolva. ({_format_throughput(count, elapsed)})")
                                     else:
                                         st.info("Nincs számla a Sheet-ben.")
                                 else:
@@ -796,7 +2501,7 @@ def render_database_page(gs_client, fs_db, logged_in=False):
                                         st.success(f"Kész! {len(invoices_sync)} számla átmásolva.")
                                     else:
                                         st.info("Nincs számla a Firestore-ban.")
-                                st.cache_data.clear()
+                                invalidate_caches(FIRESTORE_INVOICES)
                                 time.sleep(2)
                                 st.rerun()
                             except Exception as e:
@@ -805,14 +2510,55 @@ def render_database_page(gs_client, fs_db, logged_in=False):
                     if st.button("👤 Tagok szinkronizálása", type="primary", use_container_width=True):
                         with st.spinner("Folyamatban..."):
                             if sync_source == "Google Sheets":
-                                ok, msg = sync_members_gs_to_fs(gs_client, fs_db)
-                                get_members_fs.clear()
+                                ok, msg = sync_members_gs_to_fs(gs_client, fs_db, _sync_progress_callback("Tagok szinkronizálása..."))
                             else:
                                 ok, msg = sync_members_fs_to_gs(fs_db, gs_client)
                             st.success(f"✅ {msg}") if ok else st.error(f"❌ {msg}")
-                            st.cache_data.clear()
+                            invalidate_caches(FIRESTORE_MEMBERS)
                             time.sleep(2)
                             st.rerun()
+                st.caption("Az alkalmankénti résztvevő-összesítők a jelenléti adatokból újraépíthetők:")
+                if st.button("📊 Alkalom-összesítők újraépítése", use_container_width=True, key="db_rebuild_summaries"):
+                    with st.spinner("Folyamatban..."):
+                        try:
+                            count, elapsed = rebuild_session_summaries_fs(
+                                fs_db, on_progress=_sync_progress_callback("Összesítők írása..."))
+                            st.success(f"Kész! {count} alkalom összesítője újraépítve. ({_format_throughput(count, elapsed)})")
+                        except Exception as e:
+                            st.error(f"Hiba: {e}")
+                pending = pending_migrations(fs_db)
+                st.caption("Adatbázis-migrációk: " + (", ".join(FIRESTORE_MIGRATIONS[step][0] for step in pending)
+                                                      if pending else "minden lépés lefutott ✅"))
+                if pending and st.button("🧹 Migrációk futtatása", use_container_width=True, key="db_run_migrations"):
+                    with st.spinner("Folyamatban..."):
+                        try:
+                            done = run_migrations_fs(fs_db, on_progress=_sync_progress_callback("Migráció..."))
+                            st.success(f"Kész! {len(done)} migrációs lépés lefutott.")
+                        except Exception as e:
+                            st.error(f"Hiba: {e}")
+                st.caption("A helyi SQLite replika a Firestore teljes tartalmából tölthető újra:")
+                if st.button("🗄️ Helyi SQLite replika frissítése", use_container_width=True, key="db_refresh_sqlite"):
+                    with st.spinner("Folyamatban..."):
+                        try:
+                            count, elapsed = refresh_sqlite_replica(FirestoreRepository(fs_db))
+                            st.success(f"Kész! {count} jelenléti sor a replikában. ({_format_throughput(count, elapsed)})")
+                        except Exception as e:
+                            st.error(f"Hiba: {e}")
+                st.caption("Elemzésekhez típusos, havonta particionált Parquet pillanatkép készíthető:")
+                full_export = st.checkbox("Teljes újraírás (egyébként csak az utolsó exportált hónaptól)", key="db_parquet_full")
+                if st.button("📦 Parquet pillanatkép exportálása", use_container_width=True, key="db_export_parquet"):
+                    with st.spinner("Folyamatban..."):
+                        try:
+                            counts, elapsed = export_parquet_snapshot(fs_db, full=full_export)
+                            st.session_state.parquet_snapshot_zip = parquet_snapshot_zip()
+                            total = sum(counts.values())
+                            st.success(f"Kész! {total} sor exportálva. ({_format_throughput(total, elapsed)})")
+                        except Exception as e:
+                            st.error(f"Hiba: {e}")
+                if st.session_state.get("parquet_snapshot_zip"):
+                    st.download_button("📥 Parquet pillanatkép letöltése (ZIP)", data=st.session_state.parquet_snapshot_zip,
+                                       file_name=f"parquet_pillanatkep_{datetime.now(HUNGARY_TZ).strftime('%Y%m%d')}.zip",
+                                       mime="application/zip", use_container_width=True, key="db_download_parquet")
 
             st.markdown("---")
             view_selection = st.radio("Mit szeretnél megtekinteni/szerkeszteni?",
@@ -822,51 +2568,51 @@ def render_database_page(gs_client, fs_db, logged_in=False):
             view_selection = "👥 Jelenléti adatok"
 
         if view_selection == "👥 Jelenléti adatok":
-            df_fs = get_attendance_rows_fs(fs_db)
-            if not df_fs.empty:
-                col_sort_fs, col_order_fs = st.columns([2, 1])
-                with col_sort_fs:
-                    sortable_cols = [c for c in df_fs.columns if c != "ID"]
-                    sort_col_fs = st.selectbox("Rendezés alapja:", sortable_cols, index=2, key="db_sort_col")
-                with col_order_fs:
-                    ascending_fs = st.checkbox("Növekvő sorrend", value=False, key="db_asc")
-                df_fs = df_fs.sort_values(by=sort_col_fs, ascending=ascending_fs).reset_index(drop=True)
+            df_fs, editor_key = render_attendance_browser(fs_db)
+            if df_fs is not None and not df_fs.empty:
                 edit_mode = st.toggle("✏️ Szerkesztés mód bekapcsolása", key="db_edit_toggle")
                 if edit_mode:
                     st.info("💡 Kattints duplán a cellákra a szerkesztéshez! Törléshez jelöld ki a sort és nyomj **Delete**-t.")
-                    st.data_editor(df_fs, key="db_fs_editor", num_rows="dynamic",
+                    st.data_editor(df_fs, key=editor_key, num_rows="dynamic",
                                    column_config={"ID": None}, use_container_width=True)
                     if st.button("💾 Változtatások mentése a felhőbe", type="primary", key="db_save_btn"):
-                        changes = st.session_state["db_fs_editor"]
+                        changes = st.session_state[editor_key]
                         if changes.get("edited_rows") or changes.get("added_rows") or changes.get("deleted_rows"):
                             try:
-                                for row_idx in changes.get("deleted_rows", []):
-                                    fs_db.collection(FIRESTORE_COLLECTION).document(df_fs.iloc[row_idx]["ID"]).delete()
                                 col_map = {"Név": "name", "Jön-e": "status", "Regisztráció Időpontja": "timestamp",
                                            "Alkalom Dátuma": "event_date", "Mód": "mode"}
-                                for row_idx, edits in changes.get("edited_rows", {}).items():
-                                    doc_id = df_fs.iloc[row_idx]["ID"]
-                                    update_data = {col_map[k]: v for k, v in edits.items() if k in col_map}
-                                    if update_data:
-                                        fs_db.collection(FIRESTORE_COLLECTION).document(doc_id).update(update_data)
-                                for new_row in changes.get("added_rows", []):
-                                    fs_db.collection(FIRESTORE_COLLECTION).add({
+                                ops = editor_change_ops(
+                                    fs_db, FIRESTORE_COLLECTION, df_fs, changes,
+                                    to_update=lambda edits: stamp_updated(canonical_attendance_fields(
+                                        {col_map[k]: v for k, v in edits.items() if k in col_map})),
+                                    to_new=lambda new_row: stamp_updated(canonical_attendance_fields({
                                         "name": new_row.get("Név", ""), "status": new_row.get("Jön-e", "Yes"),
                                         "timestamp": new_row.get("Regisztráció Időpontja", datetime.now(HUNGARY_TZ).strftime("%Y-%m-%d %H:%M:%S")),
                                         "event_date": new_row.get("Alkalom Dátuma", ""), "mode": new_row.get("Mód", "valós")
-                                    })
-                                st.success("Sikeresen frissítetted a felhő adatbázist! ✅")
-                                st.cache_data.clear()
-                                time.sleep(1.5)
-                                st.rerun()
+                                    })))
+                                results = apply_change_set_fs(fs_db, ops)
+                                deleted_ids, updated, added = committed_changes(results)
+                                apply_attendance_cache_changes(deleted_ids, updated, added)
+                                invalidate_caches(FIRESTORE_COLLECTION)
+                                summaries_ok = True
+                                try:
+                                    update_session_summaries_fs(fs_db, attendance_affected_dates(df_fs, deleted_ids, updated, added))
+                                except Exception as e:
+                                    summaries_ok = False
+                                    st.error(f"Az alkalom-összesítők frissítése nem sikerült: {e}. "
+                                             "A Szinkronizálás panelen újraépíthetők.")
+                                if render_change_set_results(results) and summaries_ok:
+                                    st.success(f"Sikeresen frissítetted a felhő adatbázist! ✅ ({change_set_summary(results)})")
+                                    time.sleep(1.5)
+                                    st.rerun()
                             except Exception as e:
                                 st.error(f"Mentési hiba: {e}")
                         else:
                             st.info("Nem történt változtatás.")
                 else:
                     st.dataframe(df_fs.drop(columns=["ID"]), use_container_width=True)
-            else:
-                st.info("Még nincsenek adatok a Firestore adatbázisban.")
+            elif df_fs is not None:
+                st.info("Nincs a szűrésnek megfelelő adat a Firestore adatbázisban.")
 
         elif view_selection == "🧾 Számlák" and logged_in:
             invoices = get_invoices_fs(fs_db)
@@ -888,20 +2634,15 @@ def render_database_page(gs_client, fs_db, logged_in=False):
                         changes = st.session_state["db_inv_editor"]
                         if changes.get("edited_rows") or changes.get("added_rows") or changes.get("deleted_rows"):
                             try:
-                                for row_idx in changes.get("deleted_rows", []):
-                                    fs_db.collection(FIRESTORE_INVOICES).document(df_inv.iloc[row_idx]["ID"]).delete()
-                                for row_idx, edits in changes.get("edited_rows", {}).items():
-                                    doc_id = df_inv.iloc[row_idx]["ID"]
-                                    if edits:
-                                        fs_db.collection(FIRESTORE_INVOICES).document(doc_id).update(edits)
-                                for new_row in changes.get("added_rows", []):
-                                    add_data = {k: v for k, v in new_row.items() if k != "ID"}
-                                    if add_data:
-                                        fs_db.collection(FIRESTORE_INVOICES).add(add_data)
-                                st.success("Sikeresen frissítetted a számlákat! ✅")
-                                st.cache_data.clear()
-                                time.sleep(1.5)
-                                st.rerun()
+                                ops = editor_change_ops(
+                                    fs_db, FIRESTORE_INVOICES, df_inv, changes, to_update=dict,
+                                    to_new=lambda new_row: {k: v for k, v in new_row.items() if k != "ID"})
+                                results = apply_change_set_fs(fs_db, ops)
+                                invalidate_caches(FIRESTORE_INVOICES)
+                                if render_change_set_results(results):
+                                    st.success(f"Sikeresen frissítetted a számlákat! ✅ ({change_set_summary(results)})")
+                                    time.sleep(1.5)
+                                    st.rerun()
                             except Exception as e:
                                 st.error(f"Mentési hiba: {e}")
                         else:
@@ -913,18 +2654,20 @@ def render_database_page(gs_client, fs_db, logged_in=False):
 
     with tab_ranglista:
         st.subheader("Részvételi Ranglista")
-        rows = get_attendance_rows_gs(gs_client)
-        if rows:
-            v = st.selectbox("Év kiválasztása:", ["All time", "2024", "2025"], key="ranglista_ev")
-            totals = build_total_attendance(rows, int(v) if v != "All time" else None)
+        years = [str(y) for y in range(min(YEARLY_LEGACY_TOTALS), datetime.now(HUNGARY_TZ).year + 1)]
+        v = st.selectbox("Év kiválasztása:", ["All time"] + years, key="ranglista_ev")
+        counters = leaderboard_counts(fs_db, int(v) if v != "All time" else None)
+        if counters is None:
+            st.warning("Nem sikerült betölteni a Firestore adatokat.")
+        else:
             legacy = dict(LEGACY_ATTENDANCE_TOTALS) if v == "All time" else dict(YEARLY_LEGACY_TOTALS.get(int(v), {}))
-            for n, c in totals.items():
-                legacy[n] = legacy.get(n, 0) + c
+            for year_counts in counters.values():
+                for n, c in year_counts.items():
+                    if c:
+                        legacy[n] = legacy.get(n, 0) + c
             data = [{"Helyezés": i, "Név": n, "Összes Részvétel": c}
                     for i, (n, c) in enumerate(sorted(legacy.items(), key=lambda x: (-x[1], x[0])), 1)]
             st.dataframe(data, use_container_width=True)
-        else:
-            st.warning("Nem sikerült betölteni a Google Sheets adatokat.")
 
 def render_members_page(fs_db, gs_client):
     st.title("👤 Tagok & Email Beállítások")
@@ -954,22 +2697,15 @@ def render_members_page(fs_db, gs_client):
                 elif "@" not in new_email:
                     st.warning("Érvényes email cím szükséges!")
                 else:
-                    try:
-                        fs_db.collection(FIRESTORE_MEMBERS).add({"name": new_name, "email": new_email, "active": new_active})
-                        ss = gs_client.open(GSHEET_NAME)
-                        ws_titles = [w.title for w in ss.worksheets()]
-                        if MEMBERS_SHEET_NAME not in ws_titles:
-                            ws = ss.add_worksheet(title=MEMBERS_SHEET_NAME, rows=100, cols=5)
-                            ws.append_row(["Név", "Email", "Aktív"])
-                        else:
-                            ws = ss.worksheet(MEMBERS_SHEET_NAME)
-                        ws.append_row([new_name, new_email, str(new_active)])
+                    results = add_member_both(fs_db, gs_client, new_name, new_email, new_active)
+                    invalidate_caches(FIRESTORE_MEMBERS)
+                    errors = [f"{label}: {results[b][1]}" for b, label in OUTBOX_BACKEND_LABELS.items() if not results[b][0]]
+                    if errors:
+                        st.error(f"Hiba: {'; '.join(errors)}")
+                    else:
                         st.success(f"✅ {new_name} sikeresen hozzáadva!")
-                        get_members_fs.clear()
                         time.sleep(1)
                         st.rerun()
-                    except Exception as e:
-                        st.error(f"Hiba: {e}")
         st.markdown("---")
         if df.empty:
             st.info("Még nincsenek tagok. Add hozzá őket fentebb!")
@@ -983,23 +2719,16 @@ def render_members_page(fs_db, gs_client):
                 if st.button("💾 Változtatások mentése (Firestore + Sheet)", type="primary"):
                     try:
                         changes = st.session_state["members_editor"]
-                        for idx in changes.get("deleted_rows", []):
-                            fs_db.collection(FIRESTORE_MEMBERS).document(df.iloc[idx]["ID"]).delete()
-                        field_map = {"Név": "name", "Email": "email", "Aktív": "active"}
-                        for idx, edits in changes.get("edited_rows", {}).items():
-                            doc_id = df.iloc[idx]["ID"]
-                            update = {field_map[k]: v for k, v in edits.items() if k in field_map}
-                            if update:
-                                fs_db.collection(FIRESTORE_MEMBERS).document(doc_id).update(update)
-                        for new_row in changes.get("added_rows", []):
-                            fs_db.collection(FIRESTORE_MEMBERS).add({
-                                "name": new_row.get("Név", ""), "email": new_row.get("Email", ""), "active": new_row.get("Aktív", True)
-                            })
-                        get_members_fs.clear()
-                        ok, msg = sync_members_fs_to_gs(fs_db, gs_client)
-                        st.success(f"✅ Mentve! {msg}") if ok else st.warning(f"Firestore OK, de Sheet hiba: {msg}")
-                        time.sleep(1.5)
-                        st.rerun()
+                        col = fs_db.collection(FIRESTORE_MEMBERS)
+                        new_ids = [col.document().id for _ in changes.get("added_rows", [])]
+                        fs_result, (ok, msg) = save_members_editor_changes(fs_db, gs_client, df, changes, new_ids)
+                        invalidate_caches(FIRESTORE_MEMBERS)
+                        if render_change_set_results(fs_result):
+                            st.success(f"✅ Mentve! {msg} ({change_set_summary(fs_result)})") if ok else st.warning(f"Firestore OK, de Sheet hiba: {msg}")
+                            time.sleep(1.5)
+                            st.rerun()
+                        elif not ok:
+                            st.warning(f"Sheet hiba: {msg}")
                     except Exception as e:
                         st.error(f"Hiba: {e}")
             else:
@@ -1014,8 +2743,8 @@ def render_members_page(fs_db, gs_client):
                 if direction == "Firestore → Google Sheet":
                     ok, msg = sync_members_fs_to_gs(fs_db, gs_client)
                 else:
-                    ok, msg = sync_members_gs_to_fs(gs_client, fs_db)
-                    get_members_fs.clear()
+                    ok, msg = sync_members_gs_to_fs(gs_client, fs_db, _sync_progress_callback("Tagok szinkronizálása..."))
+                    invalidate_caches(FIRESTORE_MEMBERS)
                 st.success(f"✅ {msg}") if ok else st.error(f"❌ {msg}")
                 time.sleep(1.5)
                 st.rerun()
@@ -1023,119 +2752,252 @@ def render_members_page(fs_db, gs_client):
 def render_accounting_page(fs_db, gs_client):
     st.title("💰 Havi Elszámolás")
     st.markdown("Ezzel a funkcióval kiszámolhatod a teremköltségek személyenkénti elosztását a valós jelenléti adatok alapján.")
-    invoices = get_invoices_fs(fs_db)
+    replica = offline_replica(fs_db)
+    if replica:
+        st.info("☁️ Nincs Firestore kapcsolat: az elszámolás a helyi SQLite replika adataiból készül.")
+    invoices = replica.list_invoices() if replica else get_invoices_fs(fs_db)
     if not invoices:
         st.warning("⚠️ Nem találtam számlát a Firestore-ban! Kérlek, menj az 'Adatbázis' fülre és szinkronizáld a számlákat.")
         return
+    if st.toggle("📚 Több hónap együtt (éves elszámolás)", key="accounting_batch_mode"):
+        render_batch_accounting(fs_db, invoices, replica)
+        return
     selected_inv = st.selectbox(
         "Válaszd ki az elszámolandó hónapot:", invoices,
         format_func=lambda x: f"{x['target_year']}. {x['month_name']} (Számla kelte: {x['inv_date']} | Összeg: {x['amount']:,.0f} Ft)".replace(',', ' ')
     )
     if st.button("Elszámolás Kalkulálása 🚀", type="primary"):
         with st.spinner("Kalkulálás folyamatban..."):
-            success, msg, df_elszamolas, df_osszesito, month_name, year = calculate_monthly_accounting_fs(fs_db, selected_inv)
-        if not success:
-            st.error(msg)
-            return
-        st.success(f"✅ Kalkuláció sikeres: {year}. {month_name}")
-        pdf_bytes = generate_pdf_bytes(df_osszesito, month_name, year)
-        st.download_button(label="📥 Elszámolás Letöltése (PDF)", data=pdf_bytes,
-                           file_name=f"Havi_Elszamolas_{year}_{month_name}.pdf", mime="application/pdf", type="primary")
-        st.markdown("---")
-        st.subheader("📧 Email értesítések küldése")
-        email_configured = hasattr(st, 'secrets') and "email" in st.secrets
-        if not email_configured:
-            st.warning("⚠️ Az email küldéshez add meg az email beállításokat a `.streamlit/secrets.toml` fájlban!")
-            with st.expander("Hogyan kell beállítani?"):
-                st.code("""[email]\nsender = "ropiplabda.app@gmail.com"\npassword = "xxxx xxxx xxxx xxxx"\nadmin_email = "admin@example.com" """, language="toml")
+            result = calculate_monthly_accounting_fs(fs_db, selected_inv, replica)
+        pdf = generate_pdf_bytes(result[3], result[4], result[5]) if result[0] else None
+        st.session_state.accounting_result = {"inv_id": selected_inv.get("ID"), "result": result, "pdf": pdf}
+    stored = st.session_state.get("accounting_result")
+    if not stored or stored["inv_id"] != selected_inv.get("ID"):
+        return
+    success, msg, df_elszamolas, df_osszesito, month_name, year = stored["result"]
+    if not success:
+        st.error(msg)
+        return
+    st.success(f"✅ Kalkuláció sikeres: {year}. {month_name}")
+    pdf_bytes = stored["pdf"]
+    st.download_button(label="📥 Elszámolás Letöltése (PDF)", data=pdf_bytes,
+                       file_name=f"Havi_Elszamolas_{year}_{month_name}.pdf", mime="application/pdf", type="primary")
+    st.markdown("---")
+    st.subheader("📧 Email értesítések küldése")
+    email_configured = hasattr(st, 'secrets') and "email" in st.secrets
+    if not email_configured:
+        st.warning("⚠️ Az email küldéshez add meg az email beállításokat a `.streamlit/secrets.toml` fájlban!")
+        with st.expander("Hogyan kell beállítani?"):
+            st.code("""[email]\nsender = "ropiplabda.app@gmail.com"\npassword = "xxxx xxxx xxxx xxxx"\nadmin_email = "admin@example.com" """, language="toml")
+    else:
+        members_df = replica.list_members() if replica else get_members_fs(fs_db)
+        active_members = members_df[members_df["Aktív"] == True] if not members_df.empty else pd.DataFrame()
+        if active_members.empty:
+            st.warning("⚠️ Nincsenek tagok az adatbázisban! Add hozzá őket a '👤 Tagok & Email' menüpontban.")
         else:
-            members_df = get_members_fs(fs_db)
-            active_members = members_df[members_df["Aktív"] == True] if not members_df.empty else pd.DataFrame()
-            if active_members.empty:
-                st.warning("⚠️ Nincsenek tagok az adatbázisban! Add hozzá őket a '👤 Tagok & Email' menüpontban.")
+            email_preview = []
+            for _, member in active_members.iterrows():
+                member_name = member["Név"]
+                own_match = df_osszesito[df_osszesito["Név"] == member_name]
+                own_count = int(own_match.iloc[0]["Részvétel száma"]) if not own_match.empty else 0
+                own_cost = float(own_match.iloc[0]["Fizetendő (Ft)"]) if not own_match.empty else 0.0
+                guest_prefix = f"{member_name} - "
+                guest_rows = df_osszesito[df_osszesito["Név"].str.startswith(guest_prefix)]
+                guest_count = int(guest_rows["Részvétel száma"].sum()) if not guest_rows.empty else 0
+                guest_cost = float(guest_rows["Fizetendő (Ft)"].sum()) if not guest_rows.empty else 0.0
+                total_count = own_count + guest_count
+                total_cost = own_cost + guest_cost
+                if total_cost > 0:
+                    guest_names = list(guest_rows["Név"].str.replace(guest_prefix, "", regex=False)) if not guest_rows.empty else []
+                    email_preview.append({
+                        "Név": member_name, "Email": member["Email"],
+                        "Saját részvétel": own_count,
+                        "Vendégek": ", ".join(guest_names) if guest_names else "—",
+                        "Összes részvétel": total_count,
+                        "Fizetendő (Ft)": total_cost, "📧 Küldés?": True,
+                    })
+            if not email_preview:
+                st.info("Ebben a hónapban egy aktív tagnak sem volt részvétele.")
             else:
-                email_preview = []
-                for _, member in active_members.iterrows():
-                    member_name = member["Név"]
-                    own_match = df_osszesito[df_osszesito["Név"] == member_name]
-                    own_count = int(own_match.iloc[0]["Részvétel száma"]) if not own_match.empty else 0
-                    own_cost = float(own_match.iloc[0]["Fizetendő (Ft)"]) if not own_match.empty else 0.0
-                    guest_prefix = f"{member_name} - "
-                    guest_rows = df_osszesito[df_osszesito["Név"].str.startswith(guest_prefix)]
-                    guest_count = int(guest_rows["Részvétel száma"].sum()) if not guest_rows.empty else 0
-                    guest_cost = float(guest_rows["Fizetendő (Ft)"].sum()) if not guest_rows.empty else 0.0
-                    total_count = own_count + guest_count
-                    total_cost = own_cost + guest_cost
-                    if total_cost > 0:
-                        guest_names = list(guest_rows["Név"].str.replace(guest_prefix, "", regex=False)) if not guest_rows.empty else []
-                        email_preview.append({
-                            "Név": member_name, "Email": member["Email"],
-                            "Saját részvétel": own_count,
-                            "Vendégek": ", ".join(guest_names) if guest_names else "—",
-                            "Összes részvétel": total_count,
-                            "Fizetendő (Ft)": total_cost, "📧 Küldés?": True,
-                        })
-                if not email_preview:
-                    st.info("Ebben a hónapban egy aktív tagnak sem volt részvétele.")
-                else:
-                    st.markdown(f"**{len(email_preview)} tagnak** küldhető személyes email:")
-                    preview_df = pd.DataFrame(email_preview)
-                    edited_preview = st.data_editor(
-                        preview_df, key="email_preview_editor",
-                        column_config={
-                            "📧 Küldés?": st.column_config.CheckboxColumn("📧 Küldés?"),
-                            "Fizetendő (Ft)": st.column_config.NumberColumn(format="%.0f Ft"),
-                        },
-                        disabled=["Név", "Email", "Saját részvétel", "Vendégek", "Összes részvétel", "Fizetendő (Ft)"],
-                        use_container_width=True, hide_index=True
-                    )
-                    send_col1, send_col2 = st.columns(2)
-                    with send_col1:
-                        if st.button("📧 Személyes emailek küldése", type="primary", use_container_width=True):
-                            to_send = edited_preview[edited_preview["📧 Küldés?"] == True]
-                            if to_send.empty:
-                                st.warning("Nincs kijelölt tag!")
-                            else:
-                                progress = st.progress(0, text="Emailek küldése...")
-                                success_count = 0
-                                total = len(to_send)
-                                for i, (_, row) in enumerate(to_send.iterrows()):
-                                    ok = send_personal_email(
-                                        to_address=row["Email"], name=row["Név"], month_name=month_name,
-                                        year=year, count=row["Összes részvétel"], amount=row["Fizetendő (Ft)"],
-                                        own_count=row["Saját részvétel"], guest_names=row["Vendégek"]
-                                    )
-                                    if ok:
-                                        success_count += 1
-                                    progress.progress((i + 1) / total, text=f"Küldés: {row['Név']} ({i+1}/{total})")
-                                    time.sleep(0.3)
-                                progress.empty()
-                                if success_count == total:
-                                    st.success(f"✅ Sikeresen elküldve: {success_count}/{total} email!")
-                                else:
-                                    st.warning(f"⚠️ {success_count}/{total} email elküldve.")
-                    with send_col2:
-                        if st.button("📊 Admin összesítő küldése (PDF-fel)", use_container_width=True):
-                            with st.spinner("Admin email küldése..."):
-                                ok = send_admin_summary_email(month_name, year, df_osszesito, pdf_bytes)
-                            if ok:
-                                st.success(f"✅ Admin összesítő elküldve: {st.secrets['email']['admin_email']}")
-        st.markdown("---")
-        st.subheader("💬 Üzenet a Messenger csoportba")
-        msg_text = (f"Sziasztok! 🏐\n\nElkészült a {year}. {month_name} havi röpi elszámolás!\n"
-                    f"Mindenki kapott egy emailt a pontos összeggel. 📧\n\n"
-                    f"Kérlek utaljátok a rátok eső összeget a szokásos számlaszámra! Köszi! 🙌")
-        st.code(msg_text, language="text")
-        st.markdown("---")
-        col1, col2 = st.columns(2)
-        with col1:
-            st.subheader("Bontás Alkalmanként")
-            st.dataframe(df_elszamolas, use_container_width=True)
-        with col2:
-            st.subheader("Személyenkénti Összesítő")
-            df_display = df_osszesito.copy()
-            df_display['Fizetendő (Ft)'] = df_display['Fizetendő (Ft)'].apply(lambda x: f"{x:.0f} Ft")
-            st.dataframe(df_display, use_container_width=True)
+                st.markdown(f"**{len(email_preview)} tagnak** küldhető személyes email:")
+                preview_df = pd.DataFrame(email_preview)
+                edited_preview = st.data_editor(
+                    preview_df, key="email_preview_editor",
+                    column_config={
+                        "📧 Küldés?": st.column_config.CheckboxColumn("📧 Küldés?"),
+                        "Fizetendő (Ft)": st.column_config.NumberColumn(format="%.0f Ft"),
+                    },
+                    disabled=["Név", "Email", "Saját részvétel", "Vendégek", "Összes részvétel", "Fizetendő (Ft)"],
+                    use_container_width=True, hide_index=True
+                )
+                send_col1, send_col2 = st.columns(2)
+                with send_col1:
+                    if st.button("📧 Személyes emailek küldése", type="primary", use_container_width=True):
+                        to_send = edited_preview[edited_preview["📧 Küldés?"] == True]
+                        if to_send.empty:
+                            st.warning("Nincs kijelölt tag!")
+                        else:
+                            jobs = [{
+                                "to_address": row["Email"], "name": row["Név"], "month_name": month_name,
+                                "year": year, "count": row["Összes részvétel"], "amount": row["Fizetendő (Ft)"],
+                                "own_count": row["Saját részvétel"], "guest_names": row["Vendégek"]
+                            } for _, row in to_send.iterrows()]
+                            try:
+                                st.session_state.email_dispatch = start_email_dispatch(jobs)
+                            except Exception as e:
+                                st.error(f"Email hiba: {e}")
+                with send_col2:
+                    if st.button("📊 Admin összesítő küldése (PDF-fel)", use_container_width=True):
+                        with st.spinner("Admin email küldése..."):
+                            ok = send_admin_summary_email(month_name, year, df_osszesito, pdf_bytes)
+                        if ok:
+                            st.success(f"✅ Admin összesítő elküldve: {st.secrets['email']['admin_email']}")
+                if st.session_state.get("email_dispatch") is not None:
+                    render_email_dispatch_status()
+    st.markdown("---")
+    st.subheader("💬 Üzenet a Messenger csoportba")
+    msg_text = (f"Sziasztok! 🏐\n\nElkészült a {year}. {month_name} havi röpi elszámolás!\n"
+                f"Mindenki kapott egy emailt a pontos összeggel. 📧\n\n"
+                f"Kérlek utaljátok a rátok eső összeget a szokásos számlaszámra! Köszi! 🙌")
+    st.code(msg_text, language="text")
+    st.markdown("---")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Bontás Alkalmanként")
+        st.dataframe(df_elszamolas, use_container_width=True)
+    with col2:
+        st.subheader("Személyenkénti Összesítő")
+        df_display = df_osszesito.copy()
+        df_display['Fizetendő (Ft)'] = df_display['Fizetendő (Ft)'].apply(lambda x: f"{x:.0f} Ft")
+        st.dataframe(df_display, use_container_width=True)
+
+def render_batch_accounting(fs_db, invoices, replica=None):
+    years = sorted({int(inv["target_year"]) for inv in invoices}, reverse=True)
+    year = st.selectbox("Év:", years, key="batch_accounting_year")
+    year_invoices = sorted([inv for inv in invoices if int(inv["target_year"]) == year], key=lambda x: int(x["target_month"]))
+    selected = st.multiselect(
+        "Elszámolandó hónapok:", year_invoices, default=year_invoices, key=f"batch_accounting_months_{year}",
+        format_func=lambda x: f"{invoice_label(x)} ({x['amount']:,.0f} Ft)".replace(',', ' ')
+    )
+    selected_ids = [inv.get("ID") for inv in selected]
+    if st.button("Összesített Elszámolás Kalkulálása 🚀", type="primary", disabled=not selected):
+        with st.spinner("Kalkulálás folyamatban..."):
+            result = calculate_batch_accounting_fs(fs_db, selected, replica)
+            pdf = generate_batch_pdf_bytes(result[2], result[3], result[4], f"{year}. év") if result[0] else None
+        st.session_state.batch_accounting_result = {"inv_ids": selected_ids, "year": year, "result": result, "pdf": pdf}
+    stored = st.session_state.get("batch_accounting_result")
+    if not stored or stored["inv_ids"] != selected_ids:
+        return
+    success, msg, df_months, df_people, months = stored["result"]
+    if df_months is not None:
+        for row in df_months[df_months["Megjegyzés"] != ""].to_dict("records"):
+            st.warning(f"⚠️ {row['Hónap']}: {row['Megjegyzés']}")
+    if not success:
+        st.error(msg)
+        return
+    st.success(f"✅ Kalkuláció sikeres: {stored['year']}. év, {len(months)} hónap")
+    st.download_button(label="📥 Összesített Elszámolás Letöltése (PDF)", data=stored["pdf"],
+                       file_name=f"Eves_Elszamolas_{stored['year']}.pdf", mime="application/pdf", type="primary")
+    st.markdown("---")
+    st.subheader("Bontás Havonként")
+    st.dataframe(df_months.drop(columns=["Megjegyzés"]), use_container_width=True, hide_index=True,
+                 column_config={"Számla (Ft)": st.column_config.NumberColumn(format="%.0f Ft")})
+    st.subheader("Személyenkénti Éves Összesítő")
+    money_columns = [c for c in df_people.columns if c not in ("Név", "Részvétel száma")]
+    st.dataframe(df_people, use_container_width=True, hide_index=True,
+                 column_config={c: st.column_config.NumberColumn(format="%.0f Ft") for c in money_columns})
+
+def _outbox_backend_states(entry):
+    states = []
+    for backend in entry["targets"]:
+        label = OUTBOX_BACKEND_LABELS[backend]
+        if backend in entry["delivered"]:
+            states.append(f"✅ {label}")
+        elif backend in entry["errors"]:
+            states.append(f"🔁 {label} ({entry['attempts'][backend]}. próbálkozás sikertelen: {entry['errors'][backend]})")
+        else:
+            states.append(f"⏳ {label}")
+    return " · ".join(states)
+
+@st.fragment(run_every=2)
+def _attendance_outbox_progress(gs_client, fs_client):
+    status = attendance_outbox_status(attendance_outbox(gs_client, fs_client))
+    if not status["pending"]:
+        st.rerun()
+    with st.container(border=True):
+        st.markdown(f"**Háttérmentés folyamatban ({len(status['pending'])} csomag):**")
+        for entry in status["pending"]:
+            st.caption(f"{entry['created']} · {entry['rows']} sor — {_outbox_backend_states(entry)}")
+
+def render_attendance_outbox_status(gs_client, fs_client):
+    status = attendance_outbox_status(attendance_outbox(gs_client, fs_client))
+    if status["pending"]:
+        _attendance_outbox_progress(gs_client, fs_client)
+    elif status["recent"]:
+        last = status["recent"][-1]
+        st.caption(f"Utolsó háttérmentés: {last['created']} · {last['rows']} sor — {_outbox_backend_states(last)}")
+
+def _render_email_dispatch_summary(status):
+    if status["failed"] == 0:
+        st.success(f"✅ Sikeresen elküldve: {status['sent']}/{status['total']} email!")
+        return
+    if status["aborted"]:
+        st.error(f"❌ A küldés leállt: {status['aborted']}. Ellenőrizd az email beállításokat, majd küldd újra.")
+    st.warning(f"⚠️ {status['sent']}/{status['total']} email elküldve, {status['failed']} sikertelen.")
+    st.dataframe(pd.DataFrame([{"Név": d["job"]["name"], "Email": d["job"]["to_address"], "Hiba": d["error"]}
+                               for d in status["dead_letters"]]), use_container_width=True, hide_index=True)
+    if st.button("🔁 Sikertelen emailek újraküldése", key="email_redrive_btn"):
+        try:
+            st.session_state.email_dispatch = redrive_dead_letters(st.session_state.email_dispatch)
+            st.rerun()
+        except Exception as e:
+            st.error(f"Email hiba: {e}")
+
+@st.fragment(run_every=1)
+def _email_dispatch_progress():
+    status = email_dispatch_status(st.session_state.email_dispatch)
+    if status["finished"]:
+        st.rerun()
+    done = status["sent"] + status["failed"]
+    st.progress(done / status["total"] if status["total"] else 1.0,
+                text=f"Emailek küldése... {done}/{status['total']} ({status['elapsed']:.0f} mp)")
+
+def render_email_dispatch_status():
+    status = email_dispatch_status(st.session_state.email_dispatch)
+    if status["finished"]:
+        _render_email_dispatch_summary(status)
+    else:
+        _email_dispatch_progress()
+
+def _metrics_table(record):
+    rows = [{"Függvény": name, "Hívás": m["calls"], "Olvasás": m["reads"], "Írás": m["writes"],
+             "Bájt": m["bytes"], "Idő (ms)": round(m["seconds"] * 1000, 1),
+             "Cache találat": m["hits"], "Cache hiány": m["misses"]}
+            for name, m in sorted(record["functions"].items(), key=lambda kv: -kv[1]["seconds"])]
+    return pd.DataFrame(rows)
+
+def render_diagnostics_panel():
+    records = metrics_records()
+    current = st.session_state.get("metrics_current")
+    with st.sidebar.expander("📈 Diagnosztika"):
+        if current is not None:
+            totals = metrics_totals(current)
+            wall = (current["ended"] or time.time()) - current["started"]
+            st.caption(f"Aktuális futás ({current['page']}): {wall * 1000:.0f} ms · {totals['calls']} API-hívás · "
+                       f"{totals['reads']} olvasás · {totals['writes']} írás · {totals['bytes']} bájt · "
+                       f"cache {totals['hits']} találat / {totals['misses']} hiány")
+            st.dataframe(_metrics_table(current), use_container_width=True, hide_index=True)
+        history = [{"Futás": r["label"], "Oldal": r["page"] or "", **metrics_totals(r)}
+                   for r in st.session_state.get("metrics_history", [])]
+        if history:
+            st.caption("Előző futások:")
+            st.dataframe(pd.DataFrame(history[-10:]), use_container_width=True, hide_index=True)
+        background = records[-1]
+        if background["functions"]:
+            st.caption("Háttérszálak (háttérmentés, párhuzamos írások):")
+            st.dataframe(_metrics_table(background), use_container_width=True, hide_index=True)
+        st.download_button("⬇️ Mérések exportálása (JSONL)", data=metrics_jsonl(records),
+                           file_name="ropi_metrics.jsonl", mime="application/jsonl", use_container_width=True)
 
 def render_settings_page(fs_db):
     st.title("⚙️ Beállítások (Kivételek)")
@@ -1160,7 +3022,7 @@ def render_settings_page(fs_db):
                     try:
                         fs_db.collection(FIRESTORE_CANCELLED).add({"date": date_str})
                         st.success("Sikeresen rögzítve!")
-                        st.cache_data.clear()
+                        invalidate_caches(FIRESTORE_CANCELLED)
                         time.sleep(1)
                         st.rerun()
                     except Exception as e:
@@ -1168,7 +3030,7 @@ def render_settings_page(fs_db):
     st.markdown("---")
     st.subheader("Jelenleg rögzített elmaradt edzések")
     try:
-        docs = fs_db.collection(FIRESTORE_CANCELLED).order_by("date", direction=firestore.Query.DESCENDING).stream()
+        docs = fs_db.collection(FIRESTORE_CANCELLED).select(["date"]).order_by("date", direction=firestore.Query.DESCENDING).stream()
         cancelled_list = [{"ID": doc.id, "Dátum": doc.to_dict().get("date")} for doc in docs]
         if cancelled_list:
             for item in cancelled_list:
@@ -1177,7 +3039,7 @@ def render_settings_page(fs_db):
                     c1.markdown(f"🗓️ **{item['Dátum']}**")
                     if c2.button("❌ Törlés", key=f"del_{item['ID']}", use_container_width=True):
                         fs_db.collection(FIRESTORE_CANCELLED).document(item['ID']).delete()
-                        st.cache_data.clear()
+                        invalidate_caches(FIRESTORE_CANCELLED)
                         st.rerun()
         else:
             st.info("Jelenleg nincsenek elmaradt edzések rögzítve.")
@@ -1198,8 +3060,9 @@ def admin_save_date():
 # ─────────────────────────────────────────────
 # APP START
 # ─────────────────────────────────────────────
-gs_client = get_gsheet_connection()
-fs_db = get_firestore_db()
+begin_rerun_metrics()
+gs_client = instrument_client(get_gsheet_connection(), "gspread")
+fs_db = instrument_client(get_firestore_db(), "firestore")
 
 if 'admin_step' not in st.session_state:
     reset_admin_form()
@@ -1216,10 +3079,7 @@ def check_login(email_input, password_input):
     if password_input != correct_password:
         return False
     try:
-        members_df = get_members_fs(fs_db)
-        if members_df.empty:
-            return False
-        valid_emails = [e.strip().lower() for e in members_df["Email"].tolist() if e]
+        valid_emails = [e.strip().lower() for e in get_member_emails_fs(fs_db) if e]
         return email_input.strip().lower() in valid_emails
     except Exception:
         return False
@@ -1282,3 +3142,7 @@ elif page == "👤 Tagok & Email" and st.session_state.logged_in:
     render_members_page(fs_db, gs_client)
 elif page == "Beállítások (Kivételek)" and st.session_state.logged_in:
     render_settings_page(fs_db)
+
+end_rerun_metrics(page)
+if st.session_state.logged_in:
+    render_diagnostics_panel()
@@ -0,0 +1,410 @@
+"""In-memory stand-ins for the gspread and Firestore APIs used by app.py.
+
+Both fakes count API calls, document reads and writes so benchmark results
+can report backend cost next to wall time. An optional per-call latency
+emulates network round trips.
+"""
+import itertools
+import operator
+import time
+from datetime import datetime, timezone
+
+_OPS = {
+    "==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge, "in": lambda a, b: a in b,
+}
+
+
+def _sort_key(value):
+    # Firestore orders mixed-type fields by type first: null < bool < number < string.
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    return (3, str(value))
+
+
+class Counters:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.reads = 0
+        self.writes = 0
+
+    def call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def snapshot(self):
+        return {"calls": self.calls, "reads": self.reads, "writes": self.writes}
+
+
+# ─────────────────────────────────────────────
+# gspread
+# ─────────────────────────────────────────────
+
+class FakeWorksheetNotFound(Exception):
+    pass
+
+
+class FakeWorksheet:
+    def __init__(self, counters, title, rows=None):
+        self.counters = counters
+        self.title = title
+        self.rows = [list(r) for r in rows or []]
+
+    def _used_rows(self):
+        used = len(self.rows)
+        while used and not any(self.rows[used - 1]):
+            used -= 1
+        return used
+
+    def get_all_values(self):
+        self.counters.call()
+        rows = self.rows[:self._used_rows()]
+        self.counters.reads += len(rows)
+        return [list(r) for r in rows]
+
+    def append_rows(self, rows, value_input_option=None):
+        self.counters.call()
+        self.counters.writes += len(rows)
+        used = self._used_rows()
+        self.rows[used:used + len(rows)] = [list(r) for r in rows]
+
+    def append_row(self, row, value_input_option=None):
+        self.append_rows([row], value_input_option)
+
+    def clear(self):
+        self.counters.call()
+        self.rows = []
+
+    def batch_update(self, data, value_input_option=None):
+        self.counters.call()
+        for update in data:
+            start = update["range"].split(":")[0]
+            row_idx = int("".join(ch for ch in start if ch.isdigit())) - 1
+            for offset, values in enumerate(update["values"]):
+                while len(self.rows) <= row_idx + offset:
+                    self.rows.append([])
+                self.rows[row_idx + offset] = list(values)
+                self.counters.writes += 1
+
+    def delete_rows(self, start_index, end_index=None):
+        self.counters.call()
+        end_index = end_index or start_index
+        del self.rows[start_index - 1:end_index]
+
+
+class FakeSpreadsheet:
+    def __init__(self, counters, title):
+        self.counters = counters
+        self.title = title
+        self.id = f"fake-{title}"
+        self._worksheets = [FakeWorksheet(counters, "Sheet1")]
+
+    @property
+    def sheet1(self):
+        return self._worksheets[0]
+
+    def worksheets(self):
+        self.counters.call()
+        return list(self._worksheets)
+
+    def worksheet(self, title):
+        self.counters.call()
+        for ws in self._worksheets:
+            if ws.title == title:
+                return ws
+        raise FakeWorksheetNotFound(title)
+
+    def add_worksheet(self, title, rows=100, cols=26):
+        self.counters.call()
+        ws = FakeWorksheet(self.counters, title)
+        self._worksheets.append(ws)
+        return ws
+
+    def seed(self, title, rows):
+        """Load rows into a worksheet without counting them as API traffic."""
+        for ws in self._worksheets:
+            if ws.title == title:
+                ws.rows = [list(r) for r in rows]
+                return ws
+        ws = FakeWorksheet(self.counters, title, rows)
+        self._worksheets.append(ws)
+        return ws
+
+
+class FakeGspreadClient:
+    def __init__(self, latency=0.0):
+        self.counters = Counters(latency)
+        self.spreadsheets = {}
+
+    def open(self, title):
+        self.counters.call()
+        return self.spreadsheet(title)
+
+    def open_by_key(self, key):
+        self.counters.call()
+        for ss in self.spreadsheets.values():
+            if ss.id == key:
+                return ss
+        raise FakeWorksheetNotFound(key)
+
+    def spreadsheet(self, title):
+        return self.spreadsheets.setdefault(title, FakeSpreadsheet(self.counters, title))
+
+
+# ─────────────────────────────────────────────
+# Firestore
+# ─────────────────────────────────────────────
+
+_auto_ids = itertools.count()
+
+
+def _auto_id():
+    return f"fake{next(_auto_ids):016d}"
+
+
+def _apply(dst, src, merge):
+    for key, value in src.items():
+        if merge and isinstance(value, dict):
+            _apply(dst.setdefault(key, {}), value, merge)
+        elif hasattr(value, "value") and type(value).__name__ == "Increment":
+            dst[key] = dst.get(key, 0) + value.value
+        elif type(value).__name__ == "Sentinel" and "server timestamp" in getattr(value, "description", ""):
+            dst[key] = datetime.now(timezone.utc)
+        else:
+            dst[key] = value
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    @property
+    def _counters(self):
+        return self.collection.db.counters
+
+    def _set(self, data, merge=False):
+        self._counters.writes += 1
+        docs = self.collection.docs
+        if merge:
+            _apply(docs.setdefault(self.id, {}), data, True)
+        else:
+            docs[self.id] = {}
+            _apply(docs[self.id], data, False)
+
+    def set(self, data, merge=False):
+        self._counters.call()
+        self._set(data, merge)
+
+    def update(self, data):
+        self._counters.call()
+        if self.id not in self.collection.docs:
+            raise KeyError(f"No document to update: {self.id}")
+        self._counters.writes += 1
+        _apply(self.collection.docs[self.id], data, False)
+
+    def delete(self):
+        self._counters.call()
+        self._counters.writes += 1
+        self.collection.docs.pop(self.id, None)
+
+    def get(self):
+        self._counters.call()
+        self._counters.reads += 1
+        return FakeSnapshot(self, self.collection.docs.get(self.id))
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), orders=(), limit=None, after=None, fields=None):
+        self._collection = collection
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._after = after
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = {"filters": self._filters, "orders": self._orders, "limit": self._limit,
+                 "after": self._after, "fields": self._fields}
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot)
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            current = data.get(field)
+            if current is None:
+                return False
+            if op != "in" and type(current) is not type(value):
+                return False
+            if not _OPS[op](current, value):
+                return False
+        return True
+
+    def _results(self):
+        items = [(doc_id, data) for doc_id, data in self._collection.docs.items() if self._matches(data)]
+        for field, direction in reversed(self._orders):
+            items = [item for item in items if field in item[1]]
+            items.sort(key=lambda item: _sort_key(item[1][field]), reverse=(direction == "DESCENDING"))
+        if self._after is not None:
+            ids = [doc_id for doc_id, _ in items]
+            if self._after.id in ids:
+                items = items[ids.index(self._after.id) + 1:]
+        if self._limit is not None:
+            items = items[:self._limit]
+        return items
+
+    def stream(self):
+        counters = self._collection.db.counters
+        counters.call()
+        for doc_id, data in self._results():
+            counters.reads += 1
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            yield FakeSnapshot(FakeDocumentReference(self._collection, doc_id), data)
+
+    def get(self):
+        return list(self.stream())
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self)
+
+
+class FakeAggregationResult:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def get(self):
+        counters = self._query._collection.db.counters
+        counters.call()
+        count = len(self._query._results())
+        counters.reads += 1 + count // 1000
+        return [[FakeAggregationResult(count)]]
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.docs = {}
+        FakeQuery.__init__(self, self)
+
+    def document(self, doc_id=None):
+        return FakeDocumentReference(self, doc_id or _auto_id())
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def list_documents(self, page_size=None):
+        self.db.counters.call()
+        return [FakeDocumentReference(self, doc_id) for doc_id in list(self.docs)]
+
+
+class FakeWriteBatch:
+    MAX_OPERATIONS = 500
+
+    def __init__(self, db):
+        self.db = db
+        self._ops = []
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(lambda: reference._set(data, merge))
+
+    def update(self, reference, data):
+        def op():
+            _apply(reference.collection.docs[reference.id], data, False)
+            self.db.counters.writes += 1
+        self._ops.append(op)
+
+    def delete(self, reference):
+        def op():
+            reference.collection.docs.pop(reference.id, None)
+            self.db.counters.writes += 1
+        self._ops.append(op)
+
+    def commit(self):
+        if len(self._ops) > self.MAX_OPERATIONS:
+            raise ValueError(f"Batch has {len(self._ops)} operations, the limit is {self.MAX_OPERATIONS}")
+        self.db.counters.call()
+        for op in self._ops:
+            op()
+        self._ops = []
+
+
+class FakeFirestore:
+    def __init__(self, latency=0.0):
+        self.counters = Counters(latency)
+        self.collections = {}
+
+    def collection(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        self.counters.call()
+        for reference in references:
+            self.counters.reads += 1
+            data = reference.collection.docs.get(reference.id)
+            if data is not None and field_paths is not None:
+                data = {k: v for k, v in data.items() if k in field_paths}
+            yield FakeSnapshot(reference, data)
+
+    def seed(self, name, docs):
+        """Insert documents without counting them as API traffic; returns the generated ids."""
+        col = self.collection(name)
+        ids = []
+        for data in docs:
+            doc_id = _auto_id()
+            col.docs[doc_id] = dict(data)
+            ids.append(doc_id)
+        return ids
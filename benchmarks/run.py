@@ -0,0 +1,222 @@
+"""Benchmark the app's hot paths against in-memory backends.
+
+Usage, from the repository root:
+
+    python -m benchmarks.run --sizes 1000,10000,100000 --output bench.json
+    python -m benchmarks.run --sizes 1000 --compare bench.json
+
+app.py is a Streamlit script, so only the definitions above its APP START
+banner are executed. Nothing is rendered and no real credentials are needed.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+from streamlit import config as streamlit_config
+from streamlit import logger as streamlit_logger
+
+from benchmarks.fakes import FakeFirestore, FakeGspreadClient
+from benchmarks.synthetic import (attendance_sheet_rows, generate_dataset, invoice_sheet_rows,
+                                  member_sheet_rows)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+APP_START_MARKER = "# APP START"
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def load_app():
+    with open(APP_PATH, encoding="utf-8") as f:
+        source = f.read()
+    definitions = source[:source.index(APP_START_MARKER)]
+    module = types.ModuleType("app")
+    module.__file__ = APP_PATH
+    sys.modules["app"] = module
+    exec(compile(definitions, APP_PATH, "exec"), module.__dict__)
+    return module
+
+
+def build_backends(app, dataset, latency=0.0):
+    fs_db = FakeFirestore(latency)
+    fs_db.seed(app.FIRESTORE_COLLECTION, dataset["attendance"])
+    fs_db.seed(app.FIRESTORE_INVOICES, dataset["invoices"])
+    fs_db.seed(app.FIRESTORE_CANCELLED, dataset["cancelled"])
+    fs_db.seed(app.FIRESTORE_MEMBERS, dataset["members"])
+    gs_client = FakeGspreadClient(latency)
+    ss = gs_client.spreadsheet(app.GSHEET_NAME)
+    ss.seed("Sheet1", attendance_sheet_rows(dataset["attendance"]))
+    ss.seed("Szamlak", invoice_sheet_rows(dataset["invoices"]))
+    ss.seed(app.MEMBERS_SHEET_NAME, member_sheet_rows(dataset["members"]))
+    fs_db.counters.reset()
+    gs_client.counters.reset()
+    return fs_db, gs_client
+
+
+def reset_app_caches(app):
+    app.st.cache_data.clear()
+    app.reset_attendance_cache()
+
+
+def measure(name, rows, fn, repeats, backends, setup=None):
+    timings = []
+    cost = {}
+    for _ in range(repeats):
+        if setup:
+            setup()
+        for backend in backends.values():
+            backend.counters.reset()
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+        cost = {label: backend.counters.snapshot() for label, backend in backends.items()}
+    return {
+        "benchmark": name, "rows": rows, "repeats": repeats,
+        "min_s": min(timings), "median_s": statistics.median(timings), "max_s": max(timings),
+        "backend": cost,
+    }
+
+
+def run_size(app, n_rows, repeats, seed, latency):
+    dataset = generate_dataset(n_rows, seed=seed, base_names=app.MAIN_NAME_LIST)
+    fake_fs, fake_gs = build_backends(app, dataset, latency)
+    fs_db, gs_client = app.instrument_client(fake_fs, "firestore"), app.instrument_client(fake_gs, "gspread")
+    reset_app_caches(app)
+    app.run_migrations_fs(fs_db)
+    fake_fs.counters.reset()
+    backends = {"firestore": fake_fs, "gspread": fake_gs}
+    sheet_rows = attendance_sheet_rows(dataset["attendance"])
+    summaries = fake_fs.collection(app.FIRESTORE_SESSION_SUMMARIES)
+    leaderboard = fake_fs.collection(app.FIRESTORE_LEADERBOARD)
+    invoice = app.get_invoices_fs(fs_db)[0]
+    latest = dataset["sessions"][-1]
+    results = []
+
+    def cold_summaries():
+        reset_app_caches(app)
+        summaries.docs.clear()
+        leaderboard.docs.clear()
+
+    def bench(name, fn, setup=None, times=repeats):
+        metrics = {}
+
+        def run():
+            metrics["record"] = app._new_metrics_record(name)
+            app._run_with_metrics(metrics["record"], fn)
+        results.append(measure(name, n_rows, run, times, backends, setup))
+        r = results[-1]
+        r["app_metrics"] = app.metrics_totals(metrics["record"])
+        print(f"  {name:<34} {r['median_s'] * 1000:10.1f} ms   fs reads {r['backend']['firestore']['reads']:>8}"
+              f"   bytes {r['app_metrics']['bytes']:>10}", file=sys.stderr)
+
+    accounting = {}
+
+    def run_accounting():
+        accounting["result"] = app.calculate_monthly_accounting_fs(fs_db, invoice)
+
+    bench("accounting_cold_summaries", run_accounting, setup=cold_summaries)
+    app.rebuild_session_summaries_fs(fs_db)
+    bench("accounting_warm_summaries", run_accounting, setup=lambda: reset_app_caches(app))
+    year_invoices = [inv for inv in app.get_invoices_fs(fs_db) if inv["target_year"] == invoice["target_year"]]
+    bench("accounting_batch_year", lambda: app.calculate_batch_accounting_fs(fs_db, year_invoices),
+          setup=lambda: reset_app_caches(app))
+    with tempfile.TemporaryDirectory() as replica_dir:
+        replica = app.SqliteRepository(os.path.join(replica_dir, "replica.sqlite3"))
+        bench("sqlite_replica_refresh", lambda: app.refresh_sqlite_replica(app.FirestoreRepository(fs_db), replica),
+              times=1)
+        bench("accounting_sqlite_replica", lambda: app.calculate_monthly_accounting_fs(None, invoice, replica))
+        replica.conn.close()
+    bench("build_total_attendance", lambda: app.build_total_attendance(sheet_rows))
+    bench("build_total_attendance_year", lambda: app.build_total_attendance(sheet_rows, year=latest.year))
+    df_fs = app._attendance_docs_to_df(fs_db.collection(app.FIRESTORE_COLLECTION).stream())
+    bench("overview_build_session_attendees", lambda: app.build_session_attendees(df_fs))
+    bench("overview_summary_lookup", lambda: app.get_session_summaries_fs(fs_db, (latest,)),
+          setup=lambda: reset_app_caches(app))
+    bench("attendance_snapshot_load", lambda: app.get_attendance_rows_fs(fs_db),
+          setup=lambda: reset_app_caches(app))
+    df_osszesito = accounting["result"][3]
+    bench("generate_pdf_bytes", lambda: app.generate_pdf_bytes(df_osszesito, invoice["month_name"],
+                                                               invoice["target_year"]))
+    bench("sync_attendance_gs_to_fs", lambda: app.bulk_replace_collection_fs(
+        fs_db, app.FIRESTORE_COLLECTION, app.sheet_rows_to_attendance_docs(app.get_attendance_rows_gs(gs_client))),
+        setup=lambda: reset_app_caches(app))
+    bench("rebuild_session_summaries", lambda: app.rebuild_session_summaries_fs(fs_db))
+    bench("sync_members_gs_to_fs", lambda: app.sync_members_gs_to_fs(gs_client, fs_db),
+          setup=lambda: reset_app_caches(app))
+    bench("sync_members_fs_to_gs", lambda: app.sync_members_fs_to_gs(fs_db, gs_client),
+          setup=lambda: reset_app_caches(app))
+    with tempfile.TemporaryDirectory() as export_dir:
+        bench("parquet_export_full", lambda: app.export_parquet_snapshot(fs_db, out_dir=export_dir, full=True))
+        bench("parquet_export_incremental", lambda: app.export_parquet_snapshot(fs_db, out_dir=export_dir))
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return {(r["benchmark"], r["rows"]): r for r in json.load(f)["results"]}
+
+
+def compare(results, baseline):
+    print(f"{'benchmark':<34} {'rows':>8} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for r in results:
+        old = baseline.get((r["benchmark"], r["rows"]))
+        if old is None:
+            continue
+        ratio = r["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        print(f"{r['benchmark']:<34} {r['rows']:>8} {old['median_s'] * 1000:12.1f} "
+              f"{r['median_s'] * 1000:12.1f} {ratio:7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated attendance row counts (1000 … 1000000)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency per backend API call")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="print ratios against an earlier results file")
+    args = parser.parse_args(argv)
+
+    streamlit_config.get_config_options()
+    streamlit_logger.set_log_level("error")
+    os.chdir(REPO_ROOT)
+    baseline = load_baseline(args.compare) if args.compare else None
+    app = load_app()
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = []
+    for n_rows in sizes:
+        print(f"{n_rows} rows", file=sys.stderr)
+        results += run_size(app, n_rows, args.repeats, args.seed, args.latency_ms / 1000)
+    report = {
+        "meta": {
+            "git_revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+            "created": datetime.now().isoformat(timespec="seconds"), "sizes": sizes, "repeats": args.repeats,
+            "seed": args.seed, "latency_ms": args.latency_ms,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
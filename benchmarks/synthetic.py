@@ -0,0 +1,85 @@
+"""Synthetic attendance, guest, invoice, cancellation and member data.
+
+The shape follows what the app stores in production: one row per
+registration, guests recorded as "Host - Guest", occasional "No" rows
+withdrawing an earlier "Yes", a few test-mode rows, and a mix of the
+ISO and Hungarian date formats plus legacy rows whose event date is empty.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+ROWS_PER_SESSION = 25
+GUEST_NAMES = ["Bence", "Dorka", "Eszter", "Gábor", "Hanna", "Krisztián", "Lili", "Márton", "Panni", "Zsombor"]
+
+
+def tuesdays(end, count):
+    last = end - timedelta(days=(end.weekday() - 1) % 7)
+    return [last - timedelta(weeks=i) for i in range(count)][::-1]
+
+
+def member_names(n_rows, base_names=()):
+    extra = max(0, min(2000, n_rows // 2000) - len(base_names))
+    return list(base_names) + [f"Tag {i:04d}" for i in range(extra)] or ["Tag 0000"]
+
+
+def _event_date_text(rng, d):
+    roll = rng.random()
+    if roll < 0.70:
+        return d.strftime("%Y-%m-%d")
+    if roll < 0.95:
+        return d.strftime("%Y. %m. %d.")
+    return ""
+
+
+def generate_dataset(n_rows, seed=0, end=date(2025, 12, 31), base_names=()):
+    rng = random.Random(seed)
+    names = member_names(n_rows, base_names)
+    session_count = max(4, min(520, n_rows // ROWS_PER_SESSION))
+    sessions = tuesdays(end, session_count)
+    cancelled = {d for d in sessions if rng.random() < 0.03}
+    active_sessions = [d for d in sessions if d not in cancelled] or sessions
+    attendance = []
+    while len(attendance) < n_rows:
+        d = active_sessions[len(attendance) * len(active_sessions) // n_rows]
+        name = rng.choice(names)
+        if rng.random() < 0.15:
+            name = f"{name} - {rng.choice(GUEST_NAMES)}"
+        registered = datetime.combine(d, datetime.min.time()) - timedelta(days=rng.randint(0, 6),
+                                                                          minutes=rng.randint(0, 1439))
+        mode = "teszt" if rng.random() < 0.02 else "valós"
+        record = {"name": name, "status": "Yes", "timestamp": registered.strftime("%Y-%m-%d %H:%M:%S"),
+                  "event_date": _event_date_text(rng, d), "mode": mode}
+        attendance.append(record)
+        if rng.random() < 0.05 and len(attendance) < n_rows:
+            withdrawn = dict(record, status="No",
+                             timestamp=(registered + timedelta(hours=rng.randint(1, 48))).strftime("%Y-%m-%d %H:%M:%S"))
+            attendance.append(withdrawn)
+    months = sorted({(d.year, d.month) for d in sessions})
+    invoices = []
+    for year, month in months:
+        inv_date = date(year + (month == 12), month % 12 + 1, rng.randint(1, 7))
+        invoices.append({"inv_date": inv_date.strftime("%Y-%m-%d"), "target_year": year, "target_month": month,
+                         "amount": float(rng.randrange(40000, 120000, 500)), "filename": f"szamla_{year}_{month:02d}.pdf"})
+    members = [{"name": n, "email": f"{n.lower().replace(' ', '.')}@example.com", "active": rng.random() < 0.9}
+               for n in names]
+    return {
+        "attendance": attendance,
+        "invoices": invoices,
+        "cancelled": [{"date": d.strftime("%Y-%m-%d")} for d in sorted(cancelled)],
+        "members": members,
+        "sessions": sessions,
+    }
+
+
+def attendance_sheet_rows(attendance):
+    return [["Név", "Jön-e", "Regisztráció Időpontja", "Alkalom Dátuma", "Megjegyzés", "Mód"]] + [
+        [r["name"], r["status"], r["timestamp"], r["event_date"], "", r["mode"]] for r in attendance]
+
+
+def invoice_sheet_rows(invoices):
+    return [["Dátum", "Összeg", "Fájlnév"]] + [
+        [inv["inv_date"], f"{int(inv['amount'])} Ft", inv["filename"]] for inv in invoices]
+
+
+def member_sheet_rows(members):
+    return [["Név", "Email", "Aktív"]] + [[m["name"], m["email"], str(m["active"])] for m in members]
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from benchmarks.run import build_backends, load_app
+from benchmarks.synthetic import generate_dataset
+
+app = load_app()
+
+ROWS = [["Anna", "Yes", "2025-01-13 10:00:00", "2025-01-14", "", "valós"],
+        ["Béla", "Yes", "2025-01-13 10:05:00", "2025-01-14", "", "valós"]]
+DELIVERERS = dict(app.OUTBOX_DELIVERERS)
+
+
+@pytest.fixture
+def backends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "_outbox_worker", lambda outbox: None)
+    app._attendance_outbox.clear()
+    app.st.cache_data.clear()
+    yield build_backends(app, generate_dataset(50, base_names=app.MAIN_NAME_LIST))
+    app._attendance_outbox.clear()
+
+
+def _journal():
+    with open(app.ATTENDANCE_OUTBOX_FILE, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _counting(monkeypatch, backend, fail=False):
+    calls = []
+    deliver = DELIVERERS[backend]
+
+    def wrapped(client, entry):
+        calls.append(entry["id"])
+        if fail:
+            raise RuntimeError(f"{backend} nem elérhető")
+        return deliver(client, entry)
+    monkeypatch.setitem(app.OUTBOX_DELIVERERS, backend, wrapped)
+    return calls
+
+
+def _restart(gs_client, fs_client):
+    app._attendance_outbox.clear()
+    return app.attendance_outbox(gs_client, fs_client)
+
+
+def test_pending_entry_is_replayed_after_restart(backends):
+    fs_db, gs_client = backends
+    ok, _ = app.save_all_data(gs_client, fs_db, ROWS)
+    assert ok
+    outbox = _restart(gs_client, fs_db)
+    [entry] = outbox["entries"].values()
+    assert entry["rows"] == ROWS and entry["delivered"] == set()
+    app._flush_attendance_outbox(outbox)
+    assert not outbox["entries"]
+    stored = {doc.id for doc in fs_db.collection(app.FIRESTORE_COLLECTION).stream()}
+    assert set(entry["doc_ids"]) <= stored
+    assert gs_client.open(app.GSHEET_NAME).sheet1.get_all_values()[-2:] == ROWS
+    assert _journal() == []
+
+
+def test_only_the_failed_backend_is_retried(backends, monkeypatch):
+    fs_db, gs_client = backends
+    outbox = app.attendance_outbox(gs_client, fs_db)
+    fs_calls = _counting(monkeypatch, "fs")
+    gs_calls = _counting(monkeypatch, "gs", fail=True)
+    app.save_all_data(gs_client, fs_db, ROWS)
+    app._flush_attendance_outbox(outbox)
+    [entry] = outbox["entries"].values()
+    assert entry["delivered"] == {"fs"} and entry["attempts"] == {"gs": 1} and "gs" in entry["errors"]
+    assert {"type": "delivered", "id": entry["id"], "backend": "fs"} in _journal()
+
+    gs_calls = _counting(monkeypatch, "gs")
+    entry["next_try"] = 0.0
+    app._flush_attendance_outbox(outbox)
+    assert not outbox["entries"]
+    assert len(fs_calls) == 1 and gs_calls == [entry["id"]]
+
+
+def test_compaction_keeps_undelivered_entries(backends, monkeypatch):
+    fs_db, gs_client = backends
+    outbox = app.attendance_outbox(gs_client, fs_db)
+    app.save_all_data(gs_client, fs_db, ROWS[:1])
+    app._flush_attendance_outbox(outbox)
+    _counting(monkeypatch, "gs", fail=True)
+    app.save_all_data(gs_client, fs_db, ROWS[1:])
+    app.save_all_data(gs_client, fs_db, ROWS[:1])
+    app._flush_attendance_outbox(outbox)
+    pending = set(outbox["entries"])
+    assert len(pending) == 2
+    app._compact_outbox_journal(outbox)
+    journal = _journal()
+    assert {r["id"] for r in journal} == pending
+    assert sorted(r["backend"] for r in journal if r["type"] == "delivered") == ["fs", "fs"]
+
+    replayed = _restart(gs_client, fs_db)["entries"]
+    assert set(replayed) == pending
+    assert all(e["delivered"] == {"fs"} for e in replayed.values())
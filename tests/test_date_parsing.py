@@ -0,0 +1,37 @@
+from datetime import date
+
+import pytest
+
+from benchmarks.run import load_app
+
+app = load_app()
+
+DATE_TEXTS = [
+    "2025-01-14", "2025-1-4", "2025. 01. 14.", "2025. 01. 14", "2025.01.14.", "2025.1.4.",
+    "2025-01-14 18:30:00", "2025. 01. 14. 18:30:00", "2025.01.14 18:30", " 2025-01-14 ",
+    "2025-02-30", "2025. 13. 01.", "14/01/2025", "", "  ", "nan", "None", "abc", None, float("nan"),
+]
+
+
+def test_parse_date_series_matches_parse_date_str():
+    values = DATE_TEXTS * 3
+    expected = [app.parse_date_str(v) for v in values]
+    assert app.parse_date_series(values).tolist() == expected
+
+
+@pytest.mark.parametrize("text", ["2025-01-14", "2025-1-14", "2025. 01. 14.", "2025.01.14.",
+                                  "2025. 01. 14. 18:30:00", "2025-01-14 18:30:00"])
+def test_hungarian_formats_parse_to_the_same_day(text):
+    assert app.parse_date_str(text) == date(2025, 1, 14)
+    assert app.normalize_event_date(text) == "2025-01-14"
+
+
+def test_build_total_attendance_mixes_formats_per_session():
+    rows = [["Név", "Jön-e", "Regisztráció Időpontja", "Alkalom Dátuma"],
+            ["Anna", "Yes", "2025-01-13 10:00:00", "2025. 01. 14."],
+            ["Anna", "Yes", "2025-01-13 11:00:00", "2025-01-14"],
+            ["Béla", "Yes", "2025-01-13 10:00:00", "2025.01.14."],
+            ["Béla", "No", "2025-01-13 12:00:00", "2025-1-14"],
+            ["Cili", "Yes", "2024. 12. 30. 09:00:00", ""]]
+    assert app.build_total_attendance(rows) == {"Anna": 1, "Cili": 1}
+    assert app.build_total_attendance(rows, year=2024) == {"Cili": 1}
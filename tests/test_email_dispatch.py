@@ -0,0 +1,99 @@
+import smtplib
+
+import pytest
+
+from benchmarks.run import load_app
+
+app = load_app()
+
+SETTINGS = {"sender": "ropi@example.com", "password": "titok", "host": "localhost", "port": 2525,
+            "ssl": False, "rate_per_second": 1000.0}
+
+
+class StubSMTP:
+    connections = []
+    drop_after = None
+    always_fail = set()
+    reject_login = False
+
+    def __init__(self, host, port):
+        self.sent = []
+        self.closed = False
+        self.tls = False
+        StubSMTP.connections.append(self)
+
+    def starttls(self):
+        self.tls = True
+
+    def login(self, user, password):
+        if StubSMTP.reject_login:
+            raise smtplib.SMTPAuthenticationError(535, b"bad credentials")
+
+    def send_message(self, msg):
+        if self.closed:
+            raise smtplib.SMTPServerDisconnected("connection closed")
+        if msg["To"] in StubSMTP.always_fail:
+            raise smtplib.SMTPResponseException(451, b"try again later")
+        if StubSMTP.drop_after is not None and len(self.sent) == StubSMTP.drop_after:
+            StubSMTP.drop_after = None
+            self.closed = True
+            raise smtplib.SMTPServerDisconnected("connection dropped")
+        self.sent.append(msg["To"])
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def stub_smtp(monkeypatch):
+    monkeypatch.setattr(smtplib, "SMTP", StubSMTP)
+    monkeypatch.setattr(app, "EMAIL_MAX_WORKERS", 1)
+    monkeypatch.setattr(app, "EMAIL_BACKOFF_SECONDS", 0.0)
+    StubSMTP.connections = []
+    StubSMTP.drop_after = None
+    StubSMTP.always_fail = set()
+    StubSMTP.reject_login = False
+
+
+def _jobs(*addresses):
+    return [{"to_address": a, "name": "Teszt Elek", "month_name": "Január", "year": 2025, "count": 3,
+             "amount": 4500} for a in addresses]
+
+
+def _dispatch(jobs):
+    dispatch = app.start_email_dispatch(jobs, SETTINGS)
+    for future in dispatch["futures"]:
+        future.result(timeout=10)
+    return app.email_dispatch_status(dispatch)
+
+
+def test_worker_reuses_one_connection():
+    status = _dispatch(_jobs("a@x.hu", "b@x.hu", "c@x.hu"))
+    assert status["sent"] == 3 and status["failed"] == 0
+    assert len(StubSMTP.connections) == 1
+    assert StubSMTP.connections[0].tls and StubSMTP.connections[0].closed
+
+
+def test_dropped_connection_reconnects_and_resends():
+    StubSMTP.drop_after = 1
+    status = _dispatch(_jobs("a@x.hu", "b@x.hu", "c@x.hu"))
+    assert status["sent"] == 3 and status["failed"] == 0
+    assert len(StubSMTP.connections) == 2
+    assert StubSMTP.connections[1].sent == ["b@x.hu", "c@x.hu"]
+
+
+def test_persistent_transient_failure_goes_to_dead_letters():
+    StubSMTP.always_fail = {"b@x.hu"}
+    status = _dispatch(_jobs("a@x.hu", "b@x.hu", "c@x.hu"))
+    assert status["sent"] == 2 and not status["aborted"]
+    assert [d["job"]["to_address"] for d in status["dead_letters"]] == ["b@x.hu"]
+    assert "451" in status["dead_letters"][0]["error"]
+    assert len(StubSMTP.connections) == 1 + app.EMAIL_MAX_ATTEMPTS
+
+
+def test_auth_error_aborts_the_dispatch():
+    StubSMTP.reject_login = True
+    status = _dispatch(_jobs("a@x.hu", "b@x.hu", "c@x.hu"))
+    assert status["sent"] == 0 and status["aborted"]
+    assert sorted(d["job"]["to_address"] for d in status["dead_letters"]) == ["a@x.hu", "b@x.hu", "c@x.hu"]
+    assert len(StubSMTP.connections) == 1
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from benchmarks.fakes import FakeGspreadClient
+from benchmarks.run import load_app
+
+app = load_app()
+
+ANNA = app.member_doc("Anna", "anna@example.com", True)
+BELA = app.member_doc("Béla", "bela@example.com", True)
+CILI = app.member_doc("Cili", "", False)
+
+
+def _members(*docs):
+    return pd.DataFrame([app._member_sheet_row(d) for d in docs], columns=app.MEMBER_SHEET_HEADER)
+
+
+def test_diff_members_unchanged_rows_produce_nothing():
+    assert app.diff_members([ANNA, BELA], {0: ANNA, 1: BELA}) == ([], [], [])
+
+
+def test_diff_members_inserts_and_deletes():
+    inserts, updates, deletes = app.diff_members([ANNA, CILI], {0: ANNA, 1: BELA})
+    assert inserts == [CILI] and updates == [] and deletes == [1]
+
+
+def test_diff_members_matches_by_email_then_name():
+    renamed = app.member_doc("Anna Kovács", "ANNA@example.com", True)
+    inactive = app.member_doc("cili", "", False)
+    inserts, updates, deletes = app.diff_members([renamed, inactive], {3: ANNA, 7: app.member_doc("Cili", "", True)})
+    assert inserts == [] and deletes == []
+    assert updates == [(3, renamed), (7, inactive)]
+
+
+def test_diff_members_duplicate_names_match_once():
+    twin = app.member_doc("Anna", "", True)
+    inserts, updates, deletes = app.diff_members([twin, twin], {0: twin})
+    assert inserts == [twin] and updates == [] and deletes == []
+
+
+def test_sync_clears_removed_rows_in_one_batch_update():
+    app.reset_sheet_handles()
+    gs_client = FakeGspreadClient()
+    gs_client.spreadsheet(app.GSHEET_NAME)
+    ws = app._members_worksheet(gs_client)
+    ws.append_rows([app._member_sheet_row(d) for d in (ANNA, BELA, CILI)])
+    gs_client.counters.reset()
+
+    ok, _ = app.sync_members_fs_to_gs(None, gs_client, df=_members(CILI))
+    assert ok
+    assert gs_client.counters.calls == 2
+    assert ws.get_all_values() == [app.MEMBER_SHEET_HEADER, app._member_sheet_row(CILI)]
+
+    ok, msg = app.sync_members_fs_to_gs(None, gs_client, df=_members(CILI, ANNA))
+    assert ok and "1 új, 0 módosított, 0 törölt" in msg
+    assert ws.get_all_values()[1:] == [app._member_sheet_row(CILI), app._member_sheet_row(ANNA)]
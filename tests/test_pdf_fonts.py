@@ -0,0 +1,17 @@
+import pandas as pd
+
+from benchmarks.run import load_app
+
+app = load_app()
+
+
+def _summary(*names):
+    return pd.DataFrame({"Név": list(names), "Részvétel száma": [3] * len(names),
+                         "Fizetendő (Ft)": [4500.0] * len(names)})
+
+
+def test_documents_with_different_glyphs_share_the_font_template():
+    first = app.generate_pdf_bytes(_summary("abc"), "Január", 2025)
+    for names in (["Éva Egri", "Őz Ürögi"], ["XYZ qwerty"], ["abc"]):
+        assert app.generate_pdf_bytes(_summary(*names), "Február", 2025).startswith(b"%PDF")
+    assert len(app.generate_pdf_bytes(_summary("abc"), "Január", 2025)) == len(first)
@@ -0,0 +1,59 @@
+import sqlite3
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from benchmarks.run import build_backends, load_app
+from benchmarks.synthetic import generate_dataset
+
+app = load_app()
+
+
+def _attendance(*rows):
+    return pd.DataFrame(list(rows), columns=app.ATTENDANCE_FS_COLUMNS)
+
+
+def _members(*rows):
+    return pd.DataFrame(list(rows), columns=["ID", "Név", "Email", "Aktív"])
+
+
+def _fill(repo, attendance):
+    invoices = [{"ID": "inv1", "inv_date": "2025-02-03", "target_year": 2025, "target_month": 1,
+                 "amount": 12000, "filename": "jan.pdf"}]
+    return repo.replace_all(attendance, invoices, {date(2025, 1, 21)},
+                            _members(("m1", "Anna", "anna@example.com", True)))
+
+
+def test_replace_all_round_trip():
+    repo = app.SqliteRepository(":memory:")
+    count = _fill(repo, _attendance(("a1", "Anna", "Yes", "2025-01-13 10:00:00", "2025-01-14", "online"),
+                                    ("a2", "Béla", "Yes", "2025-01-20 10:00:00", "2025. 01. 21.", "személyes")))
+    assert count == 2
+    assert repo.list_attendance(date(2025, 1, 21), date(2025, 1, 21))["ID"].tolist() == ["a2"]
+    assert [inv["ID"] for inv in repo.list_invoices()] == ["inv1"]
+    assert repo.list_cancelled_sessions() == {date(2025, 1, 21)}
+    assert repo.list_member_emails() == ["anna@example.com"]
+
+
+def test_replace_all_keeps_previous_copy_when_it_fails():
+    repo = app.SqliteRepository(":memory:")
+    _fill(repo, _attendance(("a1", "Anna", "Yes", "2025-01-13 10:00:00", "2025-01-14", "online")))
+    duplicate = ("a2", "Béla", "Yes", "2025-01-20 10:00:00", "2025-01-21", "online")
+    with pytest.raises(sqlite3.IntegrityError):
+        _fill(repo, _attendance(duplicate, duplicate))
+    assert repo.list_attendance()["ID"].tolist() == ["a1"]
+    assert len(repo.list_invoices()) == 1
+
+
+def test_accounting_from_replica_matches_firestore():
+    fs_db, _ = build_backends(app, generate_dataset(400, base_names=app.MAIN_NAME_LIST))
+    repo = app.SqliteRepository(":memory:")
+    app.refresh_sqlite_replica(app.FirestoreRepository(fs_db), repo)
+    app.st.cache_data.clear()
+    invoice = repo.list_invoices()[0]
+    from_replica = app.calculate_monthly_accounting_fs(None, invoice, repo)
+    from_firestore = app.calculate_monthly_accounting_fs(fs_db, invoice)
+    assert from_replica[0] and from_firestore[0]
+    pd.testing.assert_frame_equal(from_replica[2], from_firestore[2])
+    pd.testing.assert_frame_equal(from_replica[3], from_firestore[3])